@@ -0,0 +1,16 @@
+import starbars
+import matplotlib.pyplot as plt
+import numpy as np
+
+# Example with every pair of groups tested at once
+rng = np.random.default_rng(42)
+values_dict = {key: rng.normal(loc, 1, 20) for key, loc in zip("ABCDE", [0, 0.5, 1, 2, 3])}
+
+# Perform Welch's t-test for each pair of groups
+annotations = starbars.pairwise_tests(values_dict, test="welch")
+
+# Create boxplot
+plt.boxplot(list(values_dict.values()), tick_labels=list(values_dict.keys()))
+starbars.draw_annotation(annotations, ns_show=False)
+
+plt.show()
@@ -33,4 +33,14 @@ starbars.draw_annotation(annotations, ax=axs[0, 1])
 annotations = [('A', 'D', 0.01), ('C', 'D', 0.03)]
 starbars.draw_annotation(annotations, ax=axs[1, 0])
 
+# Or annotate several subplots at once
+starbars.draw_annotations_figure(
+    fig,
+    {
+        axs[0, 0]: [('A', 'B', 0.001), ('B', 'D', 0.2)],
+        axs[1, 1]: [('A', 'B', 0.04), ('A', 'C', 0.02)],
+    },
+    ns_show=False,
+)
+
 plt.show()
\ No newline at end of file
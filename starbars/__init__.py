@@ -5,16 +5,52 @@ significance bars and p-value labels between chosen pairs of columns.
 
 import logging
 import os
-
-import matplotlib.pyplot as plt
-
-from ._utils import pvalue_to_asterisks, get_positions, get_starbars_logger, find_level
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.colors import is_color_like
+
+from ._artist import AnnotationHandle, StarbarsArtist
+from ._batch import BatchResult, render_batch
+from ._cache import LayoutCache, get_layout_key
+from ._export import compute_layout, export_layout, import_layout
+from ._layout import (
+    AxesGeometry,
+    BarLayout,
+    calculate_bars,
+    get_data_baseline,
+    get_fitted_limits,
+    get_label_widths,
+    get_limits_transform,
+)
+from ._profile import NULL_STATS, StageStats
+from ._stats import adjust_pvalues, pairwise_tests
+from ._stream import prepare_annotations
+from ._table import AnnotationTable
+from ._utils import (
+    DEFAULT_THRESHOLDS,
+    filter_annotations,
+    get_colors,
+    get_collection_args,
+    pvalue_to_asterisks,
+    pvalues_to_asterisks,
+    get_positions,
+    get_starbars_logger,
+    LOGGER_NAME,
+    find_level,
+    level_annotations,
+    create_coordinate_transformer,
+    PositionResolver,
+)
 
 __version__ = "3.1.1"
 
 
 DEBUG = bool(os.environ.get("DEBUG_STARBARS", False))
-_logger = get_starbars_logger(logging.DEBUG if DEBUG else logging.INFO)
+_logger = (
+    get_starbars_logger(logging.DEBUG) if DEBUG else logging.getLogger(LOGGER_NAME)
+)
 
 
 def draw_annotation(
@@ -32,12 +68,23 @@ def draw_annotation(
     text_args=None,
     line_args=None,
     h_gap=0.03,
+    line_collection=False,
+    thresholds=None,
+    correction=None,
+    predicate=None,
+    top_k=None,
+    deferred=False,
+    placement="top",
+    fit_limits=True,
+    measure_text=False,
+    cache=None,
+    profile=None,
 ):
     """
     Draw statistical significance bars and p-value labels between chosen pairs of columns on existing plots.
 
-    :param annotations: list of tuples containing the x-axis labels and the p-value of the pair.
-    :type annotations: list[tuple[float | str, float | str, float]]
+    :param annotations: list of tuples containing the x-axis labels and the p-value of the pair, or an :class:`~starbars.AnnotationTable` of them, which holds many annotations in a few arrays. A pandas ``DataFrame`` or a dictionary of arrays with `group1`, `group2` and `pvalue` columns, and `hue1` and `hue2` for hue boxes, is read by column without converting each row. Annotations from an iterator, such as a generator, are read in chunks and only those that will be drawn are kept in memory.
+    :type annotations: Iterable[tuple[float | str, float | str, float]] | AnnotationTable | pandas.DataFrame | dict
     :param ax: The axis of subplots to draw annotations on. If `ax` is not provided, it implies that you are working with a single plot rather than a set of subplots. In such cases, the annotations apply to the only existing plot in the figure.
     :type ax: matplotlib.axes.Axes
     :param ns_show: whether to show non-statistical bars. (Default: True)
@@ -47,174 +94,376 @@ def draw_annotation(
     :param text_distance: distance between the bar and the text of the text. Default is 2% of the data axis.
     :param fontsize: font size of the annotations. Default is 10.
     :param mode: orientation of the data representation, 'horizontal' or 'vertical'. Default is 'vertical'.
-    :param color: color of the annotations, as matplotlib color value. Default is black.
+    :param color: color of the annotations, as matplotlib color value, or a sequence with one color per annotation. Default is black.
     :param line_width: width of the line. Default is 1.5.
-    :param dict line_args: Additional dictionary of arguments which will be passed to ax.plot for drawing lines.
+    :param dict line_args: Additional dictionary of arguments which will be passed to ax.plot, or to the :class:`~matplotlib.collections.LineCollection`, for drawing lines.
     :param dict text_args: Additional dictionary of arguments which will be passed to ax.text for drawing text.
     :param h_gap: gap between two neighbouring annotations. Default is 3% of the cross data axis.
+    :param line_collection: draw all bars as a single :class:`~matplotlib.collections.LineCollection` instead of one line per bar, which is much faster to render for many annotations. Default is False.
+    :param thresholds: sequence of `(cutoff, label)` rows in ascending order of cutoff used to label the p-values. A p-value gets the label of the first row whose cutoff it does not exceed, and labels may be format strings such as `"p = {:.3f}"`. The last row labels non-significant p-values. Default is the asterisk notation with cutoffs 0.0001, 0.001, 0.01 and 0.05.
+    :param correction: correct the p-values for multiple comparisons before labelling them, with 'bonferroni', 'holm' or 'fdr_bh' (Benjamini-Hochberg). Default is no correction.
+    :param predicate: function called with the box labels and the p-value of each annotation, which returns whether to draw it. Default is to draw all annotations.
+    :param top_k: draw only the `top_k` annotations with the lowest p-values. Default is to draw all annotations.
+    :param placement: 'top' to stack all bars above the upper limit of the data axis, or 'data' to place each bar just above the tallest data in its own span, which saves vertical space on uneven plots. Default is 'top'.
+    :param fit_limits: whether to extend the limits of the data axis so that all bars fit, with `top_margin` left above the last one. Pass 'compute' to only compute the limits, for example to apply them to shared axes at once, and lay out the bars as if they were applied. Default is True.
+    :param measure_text: stack the bars using the extents of their labels measured through the renderer, instead of estimating them from the font size, which fits multi-line, formatted or rotated labels. Each distinct label is measured once and cached. Default is False.
+    :param cache: directory, or :class:`~starbars.LayoutCache`, where the layout of the annotations is stored. When the annotations, positions, axis limits, figure size and parameters are all the same as a stored layout, the bars are drawn from it without stacking and laying them out again. Not used when `deferred` is True. Default is no cache.
+    :param profile: record the wall time and number of calls of each stage of drawing the annotations in a :class:`~starbars.StageStats`, available as the `stats` attribute of the result. A function is also called with the stats once the annotations are drawn. Stages are always recorded, and logged, when the ``DEBUG_STARBARS`` environment variable is set. Default is no profiling.
+    :param deferred: add the annotations as a single :class:`~starbars.StarbarsArtist` which calculates their geometry when the figure is drawn, so that they follow later changes of the figure size, DPI or axis limits. Default is False.
+    :returns: an :class:`~starbars.AnnotationHandle` which unpacks into the line and text artists, and can update the p-values of the drawn annotations. The :class:`~starbars.StarbarsArtist` if `deferred` is True.
     """
 
     if ax is None:
-        ax = plt.gca()
-    if line_args is None:
-        line_args = {}
-    if text_args is None:
-        text_args = {}
-
-    if mode == "vertical":
-        annot_axis = 1
-        unit_vector = (0, 1)
-        get_lim = lambda: ax.get_ylim()
-        get_other_lim = lambda: ax.get_xlim()[1] - ax.get_xlim()[0]
-        set_lim = lambda *args: ax.set_ylim(*args)
-    elif mode == "horizontal":
-        annot_axis = 0
-        unit_vector = (1, 0)
-        get_lim = lambda: ax.get_xlim()
-        get_other_lim = lambda: ax.get_ylim()[1] - ax.get_ylim()[0]
-        set_lim = lambda *args: ax.set_xlim(*args)
-    else:
-        raise ValueError("mode must be either 'vertical' or 'horizontal' :)")
-
-    coords_to_px = create_coordinate_transformer(ax, mode)
-    px_to_coords = create_coordinate_transformer(ax, mode, True)
+        import matplotlib.pyplot as plt
 
-    # Transform the annot axis interval from (0, 0) to (0, 1) into pixels
-    px_ax = (
-        ax.transAxes.transform(unit_vector)[annot_axis]
-        - ax.transAxes.transform((0, 0))[annot_axis]
-    )
-
-    # Get annot axis limit maximum
-    annot = get_lim()[1]
-
-    # Take annot axis limit maximum and add the first bar gap in axis pixels as starting point
-    annot = px_to_coords((0, coords_to_px((0, annot))[annot_axis] + px_ax * bar_gap))[
-        annot_axis
-    ]
-    y = ax.transData.inverted().transform(
-        (0, ax.transData.transform((0, ax.get_ylim()[1]))[1] + px_ax * bar_gap)
-    )[1]
-
-    dpi = ax.figure.dpi
-    text_height = (fontsize / 72) * dpi / px_ax
-
-    # Find levels
-    leveled_annotations = find_level(ax, annotations, mode)
-
-    bars = []
-    text_positions = []
-    text_labels = []
-    max_annot_px = 0
-
-    # Get the positions of the values
-    for annotation in leveled_annotations:
-        result = calculate_bar(
-            annotation,
-            ns_show,
-            annot,
-            annot_axis,
-            coords_to_px,
-            px_ax,
-            get_other_lim,
-            tip_length,
-            h_gap,
-            px_to_coords,
-            text_distance,
-            bar_gap,
-            text_height,
-        )
-        if result:
-            points, text_pos, label, bar_max = result
-            bars.append(points)
-            text_positions.append(text_pos)
-            text_labels.append(label)
-            max_annot_px = max(max_annot_px, bar_max)
-
-    draw_bars(
+        ax = plt.gca()
+    return _AnnotationPlan(
+        annotations,
         ax,
-        bars,
-        text_positions,
-        text_labels,
-        mode,
-        line_width,
-        color,
-        fontsize,
-        text_args,
-        line_args,
-    )
-
-
-def create_coordinate_transformer(ax, mode, inverse=False):
-    if inverse:
-        transformation = lambda *args: ax.transData.inverted().transform(*args)
-    else:
-        transformation = lambda *args: ax.transData.transform(*args)
+        ns_show=ns_show,
+        bar_gap=bar_gap,
+        tip_length=tip_length,
+        top_margin=top_margin,
+        text_distance=text_distance,
+        fontsize=fontsize,
+        mode=mode,
+        line_width=line_width,
+        color=color,
+        text_args=text_args,
+        line_args=line_args,
+        h_gap=h_gap,
+        line_collection=line_collection,
+        thresholds=thresholds,
+        correction=correction,
+        predicate=predicate,
+        top_k=top_k,
+        deferred=deferred,
+        placement=placement,
+        fit_limits=fit_limits,
+        measure_text=measure_text,
+        cache=cache,
+        profile=profile,
+    ).draw()
+
+
+def draw_annotations_figure(fig, annotations, threads=None, **kwargs):
+    """
+    Draw statistical annotations on several axes of a figure at once.
+
+    The annotations of every axes are filtered, stacked and laid out first, optionally in
+    parallel threads, and then drawn one axes after the other. Axes that share their
+    annotated axis are given limits that fit the bars of all of them.
+
+    :param fig: the figure, or a seaborn ``FacetGrid`` whose facet names may be used as keys
+      of `annotations`.
+    :type fig: matplotlib.figure.Figure
+    :param annotations: dictionary mapping each axes, or facet name, to its list of
+      annotations.
+    :type annotations: dict[matplotlib.axes.Axes, list[tuple[float | str, float | str, float]]]
+    :param threads: number of threads used to lay out the axes. Default is to lay them out in
+      the current thread.
+    :param kwargs: any other argument of :func:`draw_annotation`, applied to every axes.
+    :returns: dictionary mapping each axes to what :func:`draw_annotation` returned for it.
+    """
+    from matplotlib.axes import Axes
 
-    if mode == "vertical":
+    axes_dict = getattr(fig, "axes_dict", {})
+    panels = [
+        (axes_dict.get(key, key) if not isinstance(key, Axes) else key, panel)
+        for key, panel in annotations.items()
+    ]
+    for ax, _ in panels:
+        if not isinstance(ax, Axes):
+            raise ValueError(f"Could not find the axes of the facet '{ax}'.")
 
-        def coords_to_px(coords):
-            return transformation(coords)
+    def plan(panel):
+        ax, panel_annotations = panel
+        return _AnnotationPlan(panel_annotations, ax, **kwargs)
 
+    if threads:
+        with ThreadPoolExecutor(threads) as executor:
+            plans = [*executor.map(plan, panels)]
     else:
+        plans = [*map(plan, panels)]
+    if kwargs.get("fit_limits", True) is True:
+        _share_limits(plans)
+
+    # Artists are created serially, as axes of one figure are not safe to modify concurrently
+    return {plan.ax: plan.draw() for plan in plans}
+
+
+def _share_limits(plans):
+    # Axes sharing their annotated axis get the union of their fitted limits
+    groups = {}
+    for plan in plans:
+        ax = plan.ax
+        if plan.geometry_args["mode"] == "vertical":
+            siblings = ax.get_shared_y_axes().get_siblings(ax)
+        else:
+            siblings = ax.get_shared_x_axes().get_siblings(ax)
+        key = (plan.geometry_args["mode"], frozenset(map(id, siblings)))
+        groups.setdefault(key, []).append(plan)
+
+    for group in groups.values():
+        limits = (
+            min(plan.limits[0] for plan in group),
+            max(plan.limits[1] for plan in group),
+        )
+        for plan in group:
+            if tuple(plan.limits) != limits:
+                plan.set_limits(limits)
+                # The layout now depends on the sibling axes, which aren't in its cache key
+                plan._cache_key = None
 
-        def coords_to_px(coords):
-            return transformation(tuple(reversed(coords)))
-
-    return coords_to_px
-
-
-def calculate_bar(
-    annotation,
-    ns_show,
-    annot,
-    annot_axis,
-    coords_to_px,
-    px_ax,
-    get_other_lim,
-    tip_length,
-    h_gap,
-    px_to_coords,
-    text_distance,
-    bar_gap,
-    text_height,
-):
-    box1_pos, box2_pos, level, pvalue = annotation
-
-    label = pvalue_to_asterisks(pvalue)
-    if label == "ns" and not ns_show:
-        return
-
-    box1_px = coords_to_px((box1_pos + h_gap * get_other_lim() / 2, annot))[
-        +(not annot_axis)
-    ]
-    print(get_other_lim(), h_gap)
-    box2_px = coords_to_px((box2_pos - h_gap * get_other_lim() / 2, annot))[
-        +(not annot_axis)
-    ]
-    annot_px = coords_to_px((box1_pos, annot))[annot_axis]
-
-    bar_box = [box1_px, box1_px, box2_px, box2_px]
-    level_offset = px_ax * (bar_gap + tip_length + text_distance + text_height)
-    offset = annot_px + level_offset * level
 
-    bar_annot = [
-        offset,
-        px_ax * tip_length + offset,
-        px_ax * tip_length + offset,
-        offset,
-    ]
+class _AnnotationPlan:
+    """
+    Statistical annotations of one axes that are filtered, stacked and laid out, but not
+    drawn yet. See :func:`draw_annotation` for the parameters.
+    """
 
-    text_pos = px_to_coords(
-        (
-            (box1_px + box2_px) / 2,
-            px_ax * tip_length + px_ax * text_distance + offset,
+    def __init__(
+        self,
+        annotations,
+        ax,
+        ns_show=True,
+        bar_gap=0.03,
+        tip_length=0.03,
+        top_margin=0.05,
+        text_distance=0.02,
+        fontsize=10,
+        mode="vertical",
+        line_width=1.5,
+        color="k",
+        text_args=None,
+        line_args=None,
+        h_gap=0.03,
+        line_collection=False,
+        thresholds=None,
+        correction=None,
+        predicate=None,
+        top_k=None,
+        deferred=False,
+        placement="top",
+        fit_limits=True,
+        measure_text=False,
+        cache=None,
+        profile=None,
+    ):
+        if mode not in ("vertical", "horizontal"):
+            raise ValueError("mode must be either 'vertical' or 'horizontal' :)")
+        if fit_limits not in (True, False, "compute"):
+            raise ValueError("fit_limits must be True, False or 'compute'.")
+        self.fit_limits = fit_limits
+        self.ax = ax
+        self.profile = profile
+        self.stats = StageStats() if profile or DEBUG else None
+        stats = self._get_stats()
+        self.ns_show = ns_show
+        self.line_width = line_width
+        self.text_args = {} if text_args is None else text_args
+        self.line_args = {} if line_args is None else line_args
+        self.line_collection = line_collection
+        self.correction = correction
+        self.deferred = deferred
+        self.geometry_args = dict(
+            mode=mode,
+            bar_gap=bar_gap,
+            tip_length=tip_length,
+            text_distance=text_distance,
+            fontsize=fontsize,
+            h_gap=h_gap,
+            thresholds=thresholds,
+            placement=placement,
+            measure_text=measure_text,
         )
-    )
-
-    points = [px_to_coords((_box, _annot)) for _box, _annot in zip(bar_box, bar_annot)]
 
-    return points, text_pos, label, annot_px + level_offset * (level + 1)
+        with stats.stage("filtering"):
+            annotations, self.annotation_count = prepare_annotations(
+                annotations, ns_show, thresholds, predicate, top_k, correction
+            )
+
+        self._annotations = annotations
+        with stats.stage("positions"):
+            self._resolver = PositionResolver(ax, mode)
+        self.leveled_annotations = None
+
+        # Read the layout from the cache, or stack and lay out the annotations
+        self.cache = cache
+        self._cache_key = None
+        cached = None
+        if cache is not None and not deferred:
+            if not isinstance(cache, LayoutCache):
+                self.cache = LayoutCache(cache)
+            with stats.stage("cache"):
+                self._cache_key = get_layout_key(
+                    ax,
+                    annotations,
+                    self._resolver,
+                    version=__version__,
+                    ns_show=ns_show,
+                    top_margin=top_margin,
+                    fit_limits=fit_limits,
+                    text_args=self.text_args if measure_text else None,
+                    **self.geometry_args,
+                )
+                cached = self.cache.get(self._cache_key)
+        if cached is not None:
+            self.layout, self.order, self.limits = cached
+        else:
+            self._level()
+            # Fit the limits of the annotated axis, and lay out the bars as if they were
+            # applied
+            limits = None
+            if fit_limits:
+                with stats.stage("limits"):
+                    limits = get_fitted_limits(
+                        ax,
+                        self.leveled_annotations,
+                        self.baseline,
+                        mode,
+                        placement,
+                        top_margin,
+                        bar_gap,
+                        tip_length,
+                        text_distance,
+                        fontsize,
+                        thresholds,
+                        measure_text,
+                        self.text_args,
+                    )
+            self.set_limits(limits)
+        self._stored = cached is not None
+
+        if is_color_like(color):
+            self.colors = color
+        else:
+            colors = get_colors(color, self.annotation_count)
+            self.colors = [colors[i] for i in self.order]
+
+    def _level(self):
+        # Find levels, resolving the positions of the boxes from a single scan of the axes
+        ax = self.ax
+        mode = self.geometry_args["mode"]
+        label_widths = None
+        if self.geometry_args["measure_text"]:
+            label_widths = get_label_widths(
+                ax,
+                self._annotations,
+                mode,
+                self.geometry_args["fontsize"],
+                self.geometry_args["thresholds"],
+                self.text_args,
+            )
+        self.leveled_annotations = level_annotations(
+            self._annotations, self._resolver, label_widths, self._get_stats()
+        )
+        self.order = self.leveled_annotations.index
+
+        # Get the positions of the values
+        if self.geometry_args["placement"] == "data":
+            with self._get_stats().stage("limits"):
+                self.baseline = get_data_baseline(ax, self.leveled_annotations, mode)
+        else:
+            self.baseline = (ax.get_ylim() if mode == "vertical" else ax.get_xlim())[1]
+
+    def set_limits(self, limits):
+        """
+        Lay out the bars for the given limits of the annotated axis, or for the current ones
+        if `limits` is None.
+        """
+        if self.leveled_annotations is None:
+            self._level()
+        self.limits = limits
+        self._stored = False
+        transform = None
+        if limits is not None:
+            transform = get_limits_transform(
+                self.ax, self.geometry_args["mode"], limits
+            )
+        with self._get_stats().stage("geometry"):
+            self.layout = calculate_bars(
+                self.ax,
+                self.leveled_annotations,
+                baseline=self.baseline,
+                transform=transform,
+                text_args=self.text_args,
+                **self.geometry_args,
+            )
+
+    def _get_stats(self):
+        return NULL_STATS if self.stats is None else self.stats
+
+    def _report(self, result):
+        # Hand the recorded stages to the caller once everything is drawn
+        if self.stats is None:
+            return result
+        result.stats = self.stats
+        if callable(self.profile):
+            self.profile(self.stats)
+        _logger.debug("Drew %d annotations: %s", len(self.order), self.stats)
+        return result
+
+    def draw(self):
+        ax = self.ax
+        layout = self.layout
+        if self.fit_limits is True:
+            if self.geometry_args["mode"] == "vertical":
+                ax.set_ylim(self.limits)
+            else:
+                ax.set_xlim(self.limits)
+        stats = self._get_stats()
+        if self.deferred:
+            with stats.stage("artists"):
+                artist = StarbarsArtist(
+                    self.leveled_annotations,
+                    self.order,
+                    self.annotation_count,
+                    self.baseline,
+                    get_colors(self.colors, len(self.order)),
+                    self.line_width,
+                    text_args=self.text_args,
+                    line_args=self.line_args,
+                    ns_show=self.ns_show,
+                    correction=self.correction,
+                    **self.geometry_args,
+                )
+                ax.add_artist(artist)
+                # Let the current layout take part in autoscaling, like drawn lines would
+                ax.update_datalim(np.column_stack([layout.x.ravel(), layout.y.ravel()]))
+                ax.autoscale_view()
+                artist.limits = self.limits
+            return self._report(artist)
+
+        with stats.stage("artists"):
+            lines, texts = draw_bars(
+                ax,
+                np.stack([layout.x, layout.y], axis=-1),
+                np.column_stack([layout.text_x, layout.text_y]),
+                layout.labels,
+                self.geometry_args["mode"],
+                self.line_width,
+                self.colors,
+                self.geometry_args["fontsize"],
+                self.text_args,
+                self.line_args,
+                self.line_collection,
+            )
+        if self._cache_key is not None and not self._stored:
+            with stats.stage("cache"):
+                self.cache.set(self._cache_key, layout, self.order, self.limits)
+            self._stored = True
+        handle = AnnotationHandle(
+            lines,
+            texts,
+            self.order,
+            self.annotation_count,
+            self.ns_show,
+            self.geometry_args["thresholds"],
+            self.correction,
+            self.limits,
+        )
+        return self._report(handle)
 
 
 def draw_bars(
@@ -228,25 +477,56 @@ def draw_bars(
     fontsize,
     text_args,
     line_args,
+    line_collection=False,
 ):
+    """
+    Draw the bars and labels of the statistical annotations.
+
+    :param color: color of the annotations, or a sequence with one color per bar.
+    :param line_collection: draw all bars as a single
+      :class:`~matplotlib.collections.LineCollection` instead of one line per bar.
+    :returns: the line artists, either a list of :class:`~matplotlib.lines.Line2D` or a
+      :class:`~matplotlib.collections.LineCollection`, and the list of text artists.
+    """
+    colors = get_colors(color, len(bars), "bar")
 
     # Draw the statistical annotation
-    for bar, text_pos, label in zip(bars, text_positions, text_labels):
-        ax.plot(
-            [c[0] for c in bar],
-            [c[1] for c in bar],
-            lw=line_width,
-            c=color,
-            **line_args
+    if line_collection:
+        lines = LineCollection(
+            [[(c[0], c[1]) for c in bar] for bar in bars],
+            linewidths=line_width,
+            colors=colors,
+            **get_collection_args(line_args),
         )
-        ax.text(
-            text_pos[0],
-            text_pos[1],
-            label,
-            ha="center",
-            va="center",
-            fontsize=fontsize,
-            color=color,
-            rotation=-90 * (mode == "horizontal"),
-            **text_args
+        ax.add_collection(lines)
+        ax.autoscale_view()
+    else:
+        lines = []
+        for bar, bar_color in zip(bars, colors):
+            lines.extend(
+                ax.plot(
+                    [c[0] for c in bar],
+                    [c[1] for c in bar],
+                    lw=line_width,
+                    c=bar_color,
+                    **line_args,
+                )
+            )
+
+    texts = []
+    for text_pos, label, text_color in zip(text_positions, text_labels, colors):
+        texts.append(
+            ax.text(
+                text_pos[0],
+                text_pos[1],
+                label,
+                ha="center",
+                va="center",
+                fontsize=fontsize,
+                color=text_color,
+                rotation=-90 * (mode == "horizontal"),
+                **text_args,
+            )
         )
+
+    return lines, texts
@@ -0,0 +1,268 @@
+import numpy as np
+from matplotlib.artist import Artist, allow_rasterization
+from matplotlib.collections import LineCollection
+from matplotlib.text import Text
+
+from ._layout import calculate_bars
+from ._stats import adjust_pvalues
+from ._utils import get_collection_args, label_pvalues, pvalues_to_asterisks
+
+
+def relabel(pvalues, order, annotation_count, correction, thresholds, ns_show):
+    """
+    Label the new p-values of drawn annotations.
+
+    :param pvalues: one p-value per original annotation.
+    :param order: index of the original annotation of each drawn bar.
+    :returns: the label and visibility of each drawn bar.
+    """
+    if len(pvalues) != annotation_count:
+        raise ValueError(
+            f"Got {len(pvalues)} p-values for {annotation_count} annotations."
+        )
+    if correction is not None:
+        pvalues = adjust_pvalues(pvalues, correction)
+    labels, ns = label_pvalues(np.asarray(pvalues, dtype=object)[order], thresholds)
+    return labels, np.ones(len(labels), dtype=bool) if ns_show else ~ns
+
+
+class AnnotationHandle:
+    """
+    Handle on drawn statistical annotations, returned by :func:`~starbars.draw_annotation`.
+
+    The p-values of the annotations can be changed in place with :meth:`update`, which only
+    changes their labels and visibility. Unpacking the handle gives its line and text
+    artists.
+
+    :ivar lines: the line artists, either a list of :class:`~matplotlib.lines.Line2D` or a
+      :class:`~matplotlib.collections.LineCollection`.
+    :ivar texts: the list of text artists.
+    :ivar order: the index in the original annotations of each drawn bar.
+    :ivar limits: the limits of the annotated axis that fit all the bars, or None if they
+      weren't computed.
+    :ivar stats: the :class:`~starbars.StageStats` of drawing the annotations, or None if
+      they weren't profiled.
+    """
+
+    def __init__(
+        self,
+        lines,
+        texts,
+        order,
+        annotation_count,
+        ns_show=True,
+        thresholds=None,
+        correction=None,
+        limits=None,
+    ):
+        self.lines = lines
+        self.texts = texts
+        self.order = order
+        self._annotation_count = annotation_count
+        self._ns_show = ns_show
+        self._thresholds = thresholds
+        self._correction = correction
+        self.limits = limits
+        self.stats = None
+        if isinstance(lines, LineCollection):
+            self._segments = np.array(lines.get_segments())
+            self._colors = lines.get_colors()
+            if len(self._colors) == 1:
+                self._colors = np.repeat(self._colors, len(texts), axis=0)
+            self._shown = np.ones(len(texts), dtype=bool)
+
+    def __iter__(self):
+        return iter((self.lines, self.texts))
+
+    @property
+    def artists(self):
+        """
+        All the artists of the annotations.
+        """
+        if isinstance(self.lines, LineCollection):
+            return [self.lines, *self.texts]
+        return [*self.lines, *self.texts]
+
+    def update(self, pvalues, ns_show=None):
+        """
+        Change the p-values of the annotations, without stacking them again.
+
+        Annotations that weren't drawn, such as hidden non-significant ones, are not added.
+
+        :param pvalues: one p-value per annotation passed to
+          :func:`~starbars.draw_annotation`.
+        :param ns_show: whether to show non-significant bars. Default is the value used to
+          draw the annotations.
+        :returns: the artists of the annotations, to return from the update function of a
+          :class:`~matplotlib.animation.FuncAnimation` when blitting.
+        """
+        labels, visible = relabel(
+            pvalues,
+            self.order,
+            self._annotation_count,
+            self._correction,
+            self._thresholds,
+            self._ns_show if ns_show is None else ns_show,
+        )
+        for text, label, text_visible in zip(self.texts, labels, visible):
+            text.set_text(label)
+            text.set_visible(bool(text_visible))
+        if isinstance(self.lines, LineCollection):
+            if np.any(visible != self._shown):
+                self.lines.set_segments(self._segments[visible])
+                self.lines.set_color(self._colors[visible])
+                self._shown = visible
+        else:
+            for line, line_visible in zip(self.lines, visible):
+                line.set_visible(bool(line_visible))
+        return self.artists
+
+
+class StarbarsArtist(Artist):
+    """
+    Statistical annotations whose geometry is laid out at draw time.
+
+    The bars are stacked once, when the artist is created, but their geometry is only
+    calculated when the figure is drawn, so that they follow later changes to the figure
+    size, DPI, layout or axis limits. The geometry is cached until one of those changes.
+
+    Create it with ``draw_annotation(..., deferred=True)``.
+
+    :param leveled_annotations: the output of :func:`~starbars._utils.level_annotations`.
+    :param order: the index in the original annotations of each leveled annotation.
+    :param annotation_count: the number of original annotations.
+    :param baseline: data coordinate on the annotated axis above which the bars are stacked.
+    :param colors: one color per leveled annotation.
+    :param geometry_args: keyword arguments of :func:`~starbars._layout.calculate_bars`.
+    """
+
+    def __init__(
+        self,
+        leveled_annotations,
+        order,
+        annotation_count,
+        baseline,
+        colors,
+        line_width,
+        fontsize,
+        text_args,
+        line_args,
+        ns_show=True,
+        correction=None,
+        **geometry_args,
+    ):
+        super().__init__()
+        self._leveled_annotations = leveled_annotations
+        self.order = order
+        self._annotation_count = annotation_count
+        self._ns_show = ns_show
+        self._correction = correction
+        self._shown = np.ones(len(order), dtype=bool)
+        self._colors = colors
+        self.limits = None
+        self.stats = None
+        self._baseline = baseline
+        self._geometry_args = dict(
+            geometry_args, fontsize=fontsize, text_args=text_args
+        )
+        self._layout = None
+        self._layout_key = None
+
+        self.lines = LineCollection(
+            [],
+            linewidths=line_width,
+            colors=colors,
+            **get_collection_args(line_args),
+        )
+        self.texts = [
+            Text(
+                text=label,
+                ha="center",
+                va="center",
+                fontsize=fontsize,
+                color=color,
+                rotation=-90 * (geometry_args.get("mode") == "horizontal"),
+                **text_args,
+            )
+            for label, color in zip(
+                pvalues_to_asterisks(
+                    leveled_annotations.pvalue, geometry_args.get("thresholds")
+                ),
+                colors,
+            )
+        ]
+
+    def set_pvalues(self, pvalues, ns_show=None):
+        """
+        Change the p-values of the annotations, without stacking them again.
+
+        See :meth:`AnnotationHandle.update`.
+        """
+        labels, visible = relabel(
+            pvalues,
+            self.order,
+            self._annotation_count,
+            self._correction,
+            self._geometry_args.get("thresholds"),
+            self._ns_show if ns_show is None else ns_show,
+        )
+        for text, label, text_visible in zip(self.texts, labels, visible):
+            text.set_text(label)
+            text.set_visible(bool(text_visible))
+        if np.any(visible != self._shown):
+            self.lines.set_color([c for c, v in zip(self._colors, visible) if v])
+            self._shown = visible
+        self.stale = True
+        return [self]
+
+    def set_figure(self, fig):
+        super().set_figure(fig)
+        for child in self.get_children():
+            child.set_figure(fig)
+
+    def get_children(self):
+        return [self.lines, *self.texts]
+
+    def _get_layout_key(self):
+        ax = self.axes
+        return (
+            tuple(ax.viewLim.bounds),
+            tuple(ax.bbox.bounds),
+            ax.figure.dpi,
+            ax.get_xscale(),
+            ax.get_yscale(),
+        )
+
+    def get_layout(self):
+        """
+        Return the :class:`~starbars._layout.BarLayout` of the annotations for the current
+        state of the axes, calculating it again only if the axes changed.
+        """
+        key = self._get_layout_key()
+        if key != self._layout_key:
+            self._layout = calculate_bars(
+                self.axes,
+                self._leveled_annotations,
+                baseline=self._baseline,
+                **self._geometry_args,
+            )
+            self._layout_key = key
+        return self._layout
+
+    @allow_rasterization
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+        layout = self.get_layout()
+        transform = self.axes.transData
+
+        self.lines.set_transform(transform)
+        self.lines.set_clip_path(self.axes.patch)
+        self.lines.set_segments(np.stack([layout.x, layout.y], axis=-1)[self._shown])
+        self.lines.draw(renderer)
+
+        for text, x, y in zip(self.texts, layout.text_x, layout.text_y):
+            text.set_transform(transform)
+            text.set_position((x, y))
+            text.draw(renderer)
+        self.stale = False
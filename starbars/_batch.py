@@ -0,0 +1,94 @@
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+BatchResult = namedtuple("BatchResult", ["index", "path", "error"])
+BatchResult.__doc__ = """
+Outcome of one job of :func:`~starbars.render_batch`: the position of the job in the
+batch, the path of its image, and the exception it raised or None if it succeeded.
+"""
+
+
+def _init_worker():
+    # Once per worker process: render without a display, whatever the plot functions use
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _render(plot, annotations, path, figure_args, annotation_args, savefig_args):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    from . import draw_annotation
+
+    # Figures outside of pyplot are freed as soon as they are cleared and dropped
+    fig = Figure(**figure_args)
+    FigureCanvasAgg(fig)
+    try:
+        ax = fig.add_subplot()
+        plot(ax)
+        draw_annotation(annotations, ax=ax, **annotation_args)
+        fig.savefig(path, **savefig_args)
+    finally:
+        fig.clear()
+
+
+def render_batch(
+    jobs, processes=None, figure_args=None, savefig_args=None, **annotation_args
+):
+    """
+    Plot, annotate and save many figures in parallel worker processes.
+
+    Each job draws its data on a new figure, annotates it with :func:`draw_annotation` and
+    saves it. Jobs are taken lazily from `jobs` and only a few per worker are pending at any
+    time, so that batches of any size run in bounded memory. Results are yielded as soon as
+    each job finishes, which is not necessarily in the order of the jobs.
+
+    :param jobs: iterable of `(plot, annotations, path)` tuples. `plot` is a function called
+      with the axes of the new figure to draw the data on, and must be picklable, such as a
+      module level function or a :func:`functools.partial` of one. `annotations` are passed
+      to :func:`draw_annotation` and the figure is saved to `path`.
+    :param processes: number of worker processes. Default is one per CPU.
+    :param figure_args: arguments of the :class:`~matplotlib.figure.Figure` of each job, such
+      as `figsize` or `dpi`.
+    :param savefig_args: arguments of :meth:`~matplotlib.figure.Figure.savefig`.
+    :param annotation_args: any other argument of :func:`draw_annotation`, applied to every
+      job.
+    :returns: an iterator of :class:`BatchResult`, one per job. A job that raised an exception
+      has it as `error` instead of stopping the batch.
+    """
+    figure_args = {} if figure_args is None else figure_args
+    savefig_args = {} if savefig_args is None else savefig_args
+    processes = processes or os.cpu_count() or 1
+    jobs = enumerate(jobs)
+    pending = {}
+
+    with ProcessPoolExecutor(processes, initializer=_init_worker) as executor:
+
+        def submit(count):
+            for index, (plot, annotations, path) in islice(jobs, count):
+                future = executor.submit(
+                    _render,
+                    plot,
+                    annotations,
+                    path,
+                    figure_args,
+                    annotation_args,
+                    savefig_args,
+                )
+                pending[future] = index, path
+
+        try:
+            submit(2 * processes)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, path = pending.pop(future)
+                    yield BatchResult(index, path, future.exception())
+                submit(len(done))
+        finally:
+            # Don't wait for jobs nobody will read the results of
+            for future in pending:
+                future.cancel()
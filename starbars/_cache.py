@@ -0,0 +1,121 @@
+import hashlib
+import os
+import tempfile
+import zipfile
+from collections import namedtuple
+
+import numpy as np
+
+from ._extents import _get_extents
+from ._layout import BarLayout
+from ._text import get_font_key
+
+CachedLayout = namedtuple("CachedLayout", ["layout", "order", "limits"])
+CachedLayout.__doc__ = """
+A layout read from a :class:`LayoutCache`, with the index in the original annotations of
+each bar, and the fitted limits of the annotated axis or None.
+"""
+
+
+def get_layout_key(ax, annotations, resolver, mode, placement, **params):
+    """
+    Return a hash of everything the layout of the annotations on `ax` depends on.
+
+    That is the annotations left to draw, the positions of the ticks and hue boxes, the
+    limits, scales and size in pixels of the axes, the tops of the data for the 'data'
+    placement, the font of the measured labels, and the parameters of the layout.
+
+    :param annotations: the :class:`~starbars.AnnotationTable` of the filtered annotations,
+      after correcting their p-values.
+    :param resolver: the :class:`~starbars._utils.PositionResolver` of the axes.
+    :param params: any other value the layout depends on, such as the gaps and font size.
+    """
+    digest = hashlib.sha256()
+
+    def update(*values):
+        for value in values:
+            digest.update(repr(value).encode())
+            digest.update(b"\0")
+
+    update(
+        [
+            None if column is None else column.tolist()
+            for column in (
+                annotations.box1,
+                annotations.box2,
+                annotations.hue1,
+                annotations.hue2,
+                annotations.pvalue,
+                annotations.index,
+            )
+        ],
+        sorted(resolver.tick_positions.items(), key=repr),
+        sorted(resolver.hue_lists.items(), key=repr),
+        ax.viewLim.bounds,
+        ax.bbox.bounds,
+        ax.figure.dpi,
+        ax.get_xscale(),
+        ax.get_yscale(),
+        mode,
+        placement,
+        sorted(params.items()),
+    )
+    if params.get("measure_text"):
+        update(get_font_key(params.get("fontsize", 10), params.get("text_args")))
+    if placement == "data":
+        for extents in _get_extents(ax, mode):
+            digest.update(np.ascontiguousarray(extents, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+class LayoutCache:
+    """
+    On-disk cache of annotation layouts, keyed by :func:`get_layout_key`.
+
+    Each layout is stored as a NumPy ``.npz`` file named after its key, and written to a
+    temporary file first so that processes sharing the directory never read partial files.
+
+    :param directory: directory of the cache, created if it doesn't exist.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """
+        Return the :class:`CachedLayout` stored for `key`, or None if there is none.
+        """
+        try:
+            with np.load(self._get_path(key), allow_pickle=False) as data:
+                layout = BarLayout(*(data[field] for field in BarLayout._fields))
+                limits = tuple(data["limits"]) if len(data["limits"]) else None
+                return CachedLayout(layout, data["order"], limits)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            # Missing or unreadable entries are computed again
+            return None
+
+    def set(self, key, layout, order, limits=None):
+        """
+        Store the layout of the annotations for `key`.
+        """
+        arrays = layout._asdict()
+        arrays["labels"] = np.asarray(
+            [str(label) for label in layout.labels], dtype=str
+        )
+        handle, path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                np.savez(
+                    file,
+                    order=order,
+                    limits=np.asarray(() if limits is None else limits, dtype=float),
+                    **arrays,
+                )
+            os.replace(path, self._get_path(key))
+        except BaseException:
+            os.unlink(path)
+            raise
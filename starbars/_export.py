@@ -0,0 +1,189 @@
+import json
+
+import numpy as np
+
+from ._layout import (
+    AxesGeometry,
+    BarLayout,
+    calculate_bars,
+    get_fitted_limits,
+    get_label_widths,
+)
+from ._stream import prepare_annotations
+from ._utils import PositionResolver, level_annotations
+
+FORMATS = ("dict", "json", "arrow")
+
+
+def compute_layout(
+    annotations,
+    positions,
+    geometry,
+    mode="vertical",
+    ns_show=True,
+    bar_gap=0.03,
+    tip_length=0.03,
+    top_margin=0.05,
+    text_distance=0.02,
+    fontsize=10,
+    h_gap=0.03,
+    thresholds=None,
+    correction=None,
+    predicate=None,
+    top_k=None,
+    fit_limits=True,
+    measure_text=False,
+    text_args=None,
+    baseline=None,
+):
+    """
+    Stack and lay out statistical annotations without a plot.
+
+    This runs the same leveling and geometry as :func:`draw_annotation`, but from the
+    positions of the boxes and the geometry of the axes, so that other frontends can draw
+    the bars without creating a figure. See :func:`draw_annotation` for the parameters that
+    aren't listed here.
+
+    :param positions: mapping of each box label, or `(hue, group)` tuple, to its position on
+      the cross axis.
+    :param geometry: limits, scales and size in pixels of the axes.
+    :type geometry: AxesGeometry
+    :param baseline: data coordinate on the annotated axis above which the bars are stacked.
+      Default is the upper limit of the annotated axis.
+    :returns: the :class:`~starbars._layout.BarLayout`, whose `index` holds the position of
+      each bar in `annotations`, and the limits of the annotated axis that fit all the bars,
+      or None if `fit_limits` is False.
+    """
+    if not isinstance(geometry, AxesGeometry):
+        raise ValueError("geometry must be an AxesGeometry.")
+    annotations = prepare_annotations(
+        annotations, ns_show, thresholds, predicate, top_k, correction
+    )[0]
+
+    label_widths = None
+    if measure_text:
+        label_widths = get_label_widths(
+            geometry, annotations, mode, fontsize, thresholds, text_args
+        )
+    leveled = level_annotations(
+        annotations, PositionResolver.from_positions(positions, mode), label_widths
+    )
+    if baseline is None:
+        baseline = geometry.get_lim(mode)[1]
+
+    limits = None
+    if fit_limits:
+        limits = get_fitted_limits(
+            geometry,
+            leveled,
+            baseline,
+            mode,
+            "top",
+            top_margin,
+            bar_gap,
+            tip_length,
+            text_distance,
+            fontsize,
+            thresholds,
+            measure_text,
+            text_args,
+        )
+    layout = calculate_bars(
+        geometry,
+        leveled,
+        mode=mode,
+        ns_show=ns_show,
+        bar_gap=bar_gap,
+        tip_length=tip_length,
+        text_distance=text_distance,
+        fontsize=fontsize,
+        h_gap=h_gap,
+        thresholds=thresholds,
+        baseline=baseline,
+        transform=None if limits is None else geometry.get_transform(mode, limits),
+        measure_text=measure_text,
+        text_args=text_args,
+    )
+    return layout, limits
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError(
+            "Arrow layouts require pyarrow, install it with `pip install pyarrow`."
+        ) from None
+    return pyarrow
+
+
+def export_layout(layout, limits=None, format="json"):
+    """
+    Convert a layout to columns of plain values, with one row per bar.
+
+    The columns are the 4 bracket corners `x` and `y`, the label anchor `text_x` and
+    `text_y`, the `level`, the `index` of the annotation and its `label`.
+
+    :param layout: the layout to export.
+    :type layout: ~starbars._layout.BarLayout
+    :param limits: limits of the annotated axis to store with the layout.
+    :param format: 'dict' for a dictionary of lists, 'json' for its JSON text or 'arrow' for
+      a ``pyarrow.Table`` with the limits in its metadata. Default is 'json'.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(map(repr, FORMATS))}.")
+    columns = {
+        "x": np.asarray(layout.x, dtype=float).tolist(),
+        "y": np.asarray(layout.y, dtype=float).tolist(),
+        "text_x": np.asarray(layout.text_x, dtype=float).tolist(),
+        "text_y": np.asarray(layout.text_y, dtype=float).tolist(),
+        "level": np.asarray(layout.level, dtype=int).tolist(),
+        "index": np.asarray(layout.index, dtype=int).tolist(),
+        "label": [str(label) for label in layout.labels],
+    }
+    limits = None if limits is None else [float(limit) for limit in limits]
+
+    if format == "arrow":
+        pa = _import_pyarrow()
+        corners = pa.list_(pa.float64(), 4)
+        table = pa.table(
+            {
+                name: pa.array(values, corners if name in ("x", "y") else None)
+                for name, values in columns.items()
+            }
+        )
+        return table.replace_schema_metadata({"limits": json.dumps(limits)})
+    data = dict(columns, limits=limits)
+    return json.dumps(data) if format == "json" else data
+
+
+def import_layout(data, format="json"):
+    """
+    Read a layout exported with :func:`export_layout`.
+
+    :returns: the :class:`~starbars._layout.BarLayout` and the stored limits, or None.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(map(repr, FORMATS))}.")
+    if format == "arrow":
+        metadata = data.schema.metadata or {}
+        limits = json.loads(metadata.get(b"limits", b"null"))
+        data = data.to_pydict()
+    else:
+        if format == "json":
+            data = json.loads(data)
+        limits = data.get("limits")
+
+    count = len(data["index"])
+    labels = np.empty(count, dtype=object)
+    labels[:] = data["label"]
+    layout = BarLayout(
+        x=np.asarray(data["x"], dtype=float).reshape(count, 4),
+        y=np.asarray(data["y"], dtype=float).reshape(count, 4),
+        text_x=np.asarray(data["text_x"], dtype=float),
+        text_y=np.asarray(data["text_y"], dtype=float),
+        level=np.asarray(data["level"], dtype=int),
+        index=np.asarray(data["index"], dtype=int),
+        labels=labels,
+    )
+    return layout, None if limits is None else tuple(limits)
@@ -0,0 +1,159 @@
+import numpy as np
+
+
+class DataExtentIndex:
+    """
+    Index of the extents of the data drawn on an axes, to find the tallest data in a span.
+
+    Patches, lines and collections are scanned once, as intervals on the cross axis with
+    the maximum they reach on the annotated axis. Intervals starting inside a queried span
+    are found through a sparse table in O(1), and wider intervals covering its start
+    through a segment tree in O(log n).
+
+    :param ax: The axes containing the plotted data.
+    :type ax: matplotlib.axes.Axes
+    :param mode: orientation of the data representation, 'horizontal' or 'vertical'.
+    """
+
+    def __init__(self, ax, mode):
+        lo, hi, top = _get_extents(ax, mode)
+        order = np.argsort(lo, kind="stable")
+        self._lo = lo[order]
+        self._table = _sparse_table(top[order])
+
+        # Point and gap slots between the ends of the intervals, for stabbing queries
+        self._coords = np.unique(np.concatenate([lo, hi]))
+        slots = max(2 * len(self._coords) - 1, 1)
+        self._size = 1
+        while self._size < slots:
+            self._size *= 2
+        self._tags = np.full(2 * self._size, -np.inf)
+        for first, last, value in zip(
+            2 * np.searchsorted(self._coords, lo),
+            2 * np.searchsorted(self._coords, hi) + 1,
+            top,
+        ):
+            self._cover(first, last, value)
+
+    def _cover(self, first, last, value):
+        tags = self._tags
+        first += self._size
+        last += self._size
+        while first < last:
+            if first & 1:
+                tags[first] = max(tags[first], value)
+                first += 1
+            if last & 1:
+                last -= 1
+                tags[last] = max(tags[last], value)
+            first //= 2
+            last //= 2
+
+    def _stab(self, position):
+        index = np.searchsorted(self._coords, position)
+        if index < len(self._coords) and self._coords[index] == position:
+            slot = 2 * index
+        elif 0 < index < len(self._coords):
+            slot = 2 * index - 1
+        else:
+            return -np.inf
+        node = slot + self._size
+        value = -np.inf
+        while node:
+            value = max(value, self._tags[node])
+            node //= 2
+        return value
+
+    def query(self, starts, ends):
+        """
+        Return the maximum that the data reaches between each pair of cross axis positions,
+        or NaN where there is no data.
+        """
+        starts = np.asarray(starts, dtype=float)
+        ends = np.asarray(ends, dtype=float)
+        first = np.searchsorted(self._lo, starts, side="left")
+        last = np.searchsorted(self._lo, ends, side="right")
+        tops = _range_max(self._table, first, last)
+        tops = np.maximum(tops, [self._stab(start) for start in starts])
+        return np.where(np.isneginf(tops), np.nan, tops)
+
+
+def _get_extents(ax, mode):
+    # Collect the cross axis interval and annotated axis maximum of everything drawn
+    cross, annot = (0, 1) if mode == "vertical" else (1, 0)
+    to_data = ax.transData.inverted()
+    lo, hi, top = [], [], []
+
+    def add_points(points):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        points = points[~np.isnan(points).any(axis=1)]
+        lo.append(points[:, cross])
+        hi.append(points[:, cross])
+        top.append(points[:, annot])
+
+    def add_boxes(boxes):
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 2, 2)
+        boxes = boxes[np.isfinite(boxes).all(axis=(1, 2))]
+        lo.append(boxes[:, :, cross].min(axis=1))
+        hi.append(boxes[:, :, cross].max(axis=1))
+        top.append(boxes[:, :, annot].max(axis=1))
+
+    # Patches, from their extents in display coordinates
+    corners = [
+        patch.get_window_extent().get_points()
+        for patch in ax.patches
+        if patch.get_visible()
+    ]
+    if corners:
+        add_boxes(to_data.transform(np.concatenate(corners)))
+
+    for line in ax.lines:
+        if line.get_visible() and line.get_transform() == ax.transData:
+            add_points(line.get_xydata())
+
+    for collection in ax.collections:
+        if not collection.get_visible():
+            continue
+        offsets = collection.get_offsets()
+        if len(offsets) and collection.get_offset_transform() == ax.transData:
+            add_points(offsets)
+        elif collection.get_transform() == ax.transData:
+            add_boxes(
+                [
+                    path.get_extents().get_points()
+                    for path in collection.get_paths()
+                    if len(path.vertices)
+                ]
+            )
+
+    if not lo:
+        return np.empty(0), np.empty(0), np.empty(0)
+    return np.concatenate(lo), np.concatenate(hi), np.concatenate(top)
+
+
+def _sparse_table(values):
+    table = [np.asarray(values, dtype=float)]
+    width = 1
+    while 2 * width <= len(values):
+        previous = table[-1]
+        table.append(np.maximum(previous[:-width], previous[width:]))
+        width *= 2
+    return table
+
+
+def _range_max(table, first, last):
+    # Maximum of values[first:last] for each pair of bounds, -inf for empty ranges
+    length = last - first
+    result = np.full(len(first), -np.inf)
+    valid = length > 0
+    if not valid.any():
+        return result
+    level = np.floor(np.log2(length[valid])).astype(int)
+    first, last = first[valid], last[valid]
+    values = np.empty(len(first))
+    for k in np.unique(level):
+        rows = level == k
+        row = table[k]
+        values[rows] = np.maximum(row[first[rows]], row[last[rows] - (1 << k)])
+    result[valid] = values
+    return result
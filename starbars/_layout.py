@@ -0,0 +1,500 @@
+from collections import namedtuple
+
+import logging
+
+import numpy as np
+from matplotlib.scale import scale_factory
+from matplotlib.transforms import (
+    Bbox,
+    BboxTransform,
+    TransformedBbox,
+    blended_transform_factory,
+)
+
+from ._extents import DataExtentIndex
+from ._text import get_text_extents
+from ._table import AnnotationTable
+from ._utils import LOGGER_NAME, label_pvalues
+
+PLACEMENTS = ("top", "data")
+
+BarLayout = namedtuple(
+    "BarLayout", ["x", "y", "text_x", "text_y", "level", "index", "labels"]
+)
+BarLayout.__doc__ = """
+Geometry of the statistical annotations, as a structure of arrays in data coordinates.
+
+`x` and `y` have one row of 4 bracket corners per bar, `text_x` and `text_y` hold the
+anchor of each label, `level` the stacking level of each bar and `index` the position of
+each bar in the original list of annotations.
+"""
+
+
+class AxesGeometry:
+    """
+    Everything the layout of the annotations depends on in an axes: the limits and scales of
+    both axes, the size of the axes in pixels and the DPI.
+
+    Use :meth:`from_axes` for the axes of a plot, or build it from values to lay out
+    annotations without creating any figure.
+
+    :param xlim: limits of the x-axis.
+    :param ylim: limits of the y-axis.
+    :param width: width of the axes in pixels.
+    :param height: height of the axes in pixels.
+    :param dpi: resolution of the figure, which sets the size of the labels in pixels.
+    :param xscale: name of the scale of the x-axis, such as 'linear' or 'log'.
+    :param yscale: name of the scale of the y-axis.
+    """
+
+    def __init__(
+        self, xlim, ylim, width, height, dpi=100, xscale="linear", yscale="linear"
+    ):
+        self.xlim = tuple(xlim)
+        self.ylim = tuple(ylim)
+        self.width = width
+        self.height = height
+        self.dpi = dpi
+        self.scales = (
+            scale_factory(xscale, None).get_transform(),
+            scale_factory(yscale, None).get_transform(),
+        )
+        self.transform = self.get_transform()
+        self._figure = None
+
+    @classmethod
+    def from_axes(cls, ax):
+        """
+        Return the current geometry of `ax`.
+        """
+        geometry = cls.__new__(cls)
+        geometry.xlim = ax.get_xlim()
+        geometry.ylim = ax.get_ylim()
+        geometry.width = ax.bbox.width
+        geometry.height = ax.bbox.height
+        geometry.dpi = ax.figure.dpi
+        geometry.scales = (ax.xaxis.get_transform(), ax.yaxis.get_transform())
+        geometry.transform = ax.transData
+        geometry._figure = ax.figure
+        return geometry
+
+    def get_lim(self, mode):
+        """
+        Return the limits of the annotated axis.
+        """
+        return self.ylim if mode == "vertical" else self.xlim
+
+    def get_cross_lim(self, mode):
+        """
+        Return the limits of the cross axis.
+        """
+        return self.xlim if mode == "vertical" else self.ylim
+
+    def get_pixels(self, mode):
+        """
+        Return the length in pixels of the annotated axis.
+        """
+        return self.height if mode == "vertical" else self.width
+
+    def get_scale(self, mode):
+        """
+        Return the transformation of the scale of the annotated axis.
+        """
+        return self.scales[1 if mode == "vertical" else 0]
+
+    def get_transform(self, mode="vertical", limits=None):
+        """
+        Return the transformation from data coordinates to pixels, with `limits` on the
+        annotated axis instead of the current ones if given.
+        """
+        xlim, ylim = self.xlim, self.ylim
+        if limits is not None:
+            xlim, ylim = (xlim, limits) if mode == "vertical" else (limits, ylim)
+        scale = blended_transform_factory(*self.scales)
+        view = Bbox([[xlim[0], ylim[0]], [xlim[1], ylim[1]]])
+        return scale + BboxTransform(
+            TransformedBbox(view, scale),
+            Bbox.from_bounds(0, 0, self.width, self.height),
+        )
+
+    @property
+    def figure(self):
+        """
+        The figure used to measure the labels, an empty one with the same DPI when the
+        geometry isn't taken from a plot.
+        """
+        if self._figure is None:
+            from matplotlib.figure import Figure
+
+            self._figure = Figure(dpi=self.dpi)
+        return self._figure
+
+
+def get_geometry(ax):
+    """
+    Return the :class:`AxesGeometry` of `ax`, which may already be one.
+    """
+    return ax if isinstance(ax, AxesGeometry) else AxesGeometry.from_axes(ax)
+
+
+def get_text_heights(ax, labels, mode, fontsize=10, measure_text=False, text_args=None):
+    """
+    Return the height of the labels along the annotated axis, as a fraction of the axes.
+
+    :param ax: the axes, or its :class:`AxesGeometry`.
+    :param measure_text: measure each label through the renderer, see
+      :class:`~starbars._text.TextMetricsCache`, instead of estimating a single height from
+      the font size.
+    :returns: the estimated height, or one measured height per label.
+    """
+    geometry = get_geometry(ax)
+    px_ax = geometry.get_pixels(mode)
+    if not measure_text:
+        return (fontsize / 72) * geometry.dpi / px_ax
+    return (
+        get_text_extents(geometry.figure, labels, fontsize, mode, text_args)[1] / px_ax
+    )
+
+
+def get_label_widths(
+    ax, annotations, mode, fontsize=10, thresholds=None, text_args=None
+):
+    """
+    Return the measured width of the label of each annotation across the annotated axis, in
+    data coordinates.
+
+    :param ax: the axes, or its :class:`AxesGeometry`.
+    """
+    geometry = get_geometry(ax)
+    labels = label_pvalues(
+        AnnotationTable.from_annotations(annotations).pvalue, thresholds
+    )[0]
+    widths = get_text_extents(geometry.figure, labels, fontsize, mode, text_args)[0]
+    cross_mode = "horizontal" if mode == "vertical" else "vertical"
+    lower, upper = geometry.get_cross_lim(mode)
+    return widths * abs(upper - lower) / geometry.get_pixels(cross_mode)
+
+
+def get_level_offsets(level, heights):
+    """
+    Return the offset of each bar from the first level, when each level is as high as its
+    highest bar.
+    """
+    if not np.ndim(heights):
+        return level * heights
+    level_heights = np.zeros(level.max() + 1 if len(level) else 0)
+    np.maximum.at(level_heights, level, heights)
+    bottoms = np.concatenate([[0], np.cumsum(level_heights)[:-1]])
+    return bottoms[level]
+
+
+def stack_bars(starts, ends, bases, height):
+    """
+    Stack bars of equal height, each as low as its base allows without overlapping the bars
+    placed before it.
+
+    The tallest bar in the span of each new bar is found with a segment tree over the gaps
+    between bar ends, so stacking `n` bars takes O(n log n).
+
+    :param starts: left ends of the bars, in the order they are stacked.
+    :param ends: right ends of the bars.
+    :param bases: lowest offset of each bar.
+    :param height: height of a bar, or one height per bar.
+    :returns: the offset of each bar.
+    """
+    heights_of_bars = np.broadcast_to(np.asarray(height, dtype=float), len(starts))
+    coords = np.unique(np.concatenate([starts, ends]))
+    slots = max(2 * len(coords) - 1, 1)
+    size = 1
+    while size < slots:
+        size *= 2
+    # Maximum height below each node, and heights set on the whole range of a node
+    heights = [-np.inf] * (2 * size)
+    tags = [-np.inf] * (2 * size)
+
+    first_slots = 2 * np.searchsorted(coords, starts)
+    last_slots = 2 * np.searchsorted(coords, ends)
+    # Bars cover the gaps between their ends, and a single point when they have no width
+    first_slots = np.where(last_slots > first_slots, first_slots + 1, first_slots)
+    last_slots = np.maximum(last_slots, first_slots + 1)
+
+    offsets = np.empty(len(starts))
+    bars = zip(first_slots, last_slots, bases, heights_of_bars)
+    for i, (first, last, base, height) in enumerate(bars):
+        first += size
+        last += size
+        ancestors = (first // 2, (last - 1) // 2)
+
+        offset = base
+        left, right = first, last
+        while left < right:
+            if left & 1:
+                offset = max(offset, heights[left])
+                left += 1
+            if right & 1:
+                right -= 1
+                offset = max(offset, heights[right])
+            left //= 2
+            right //= 2
+        for node in ancestors:
+            while node:
+                offset = max(offset, tags[node])
+                node //= 2
+        offsets[i] = offset
+
+        top = offset + height
+        left, right = first, last
+        while left < right:
+            if left & 1:
+                heights[left] = tags[left] = top
+                left += 1
+            if right & 1:
+                right -= 1
+                heights[right] = tags[right] = top
+            left //= 2
+            right //= 2
+        for node in ancestors:
+            while node:
+                heights[node] = max(heights[node], top)
+                node //= 2
+
+    return offsets
+
+
+def calculate_bars(
+    ax,
+    leveled_annotations,
+    mode="vertical",
+    ns_show=True,
+    bar_gap=0.03,
+    tip_length=0.03,
+    text_distance=0.02,
+    fontsize=10,
+    h_gap=0.03,
+    thresholds=None,
+    baseline=None,
+    placement="top",
+    transform=None,
+    measure_text=False,
+    text_args=None,
+):
+    """
+    Calculate the geometry of all the statistical annotations at once.
+
+    All bracket corners and text anchors are computed from a single forward and a single
+    inverse transformation of the data coordinates of the axes.
+
+    :param ax: the axes, or an :class:`AxesGeometry` to lay out the annotations without a
+      plot.
+    :param leveled_annotations: the output of :func:`~starbars._utils.level_annotations`,
+      or a list of `(box1_pos, box2_pos, level, pvalue)` tuples as returned by
+      :func:`~starbars._utils.find_level`.
+    :param thresholds: threshold table of the labels, see
+      :func:`~starbars._utils.pvalues_to_asterisks`.
+    :param baseline: data coordinate on the annotated axis above which the bars are stacked,
+      or one coordinate per annotation. Default is the current upper limit of the annotated
+      axis, or the top of the data under each bar for the 'data' placement.
+    :param placement: 'top' to stack all bars above the upper limit of the annotated axis, or
+      'data' to place each bar just above the data in its span. Default is 'top'.
+    :param transform: transformation from data to pixels. Default is the current
+      transformation of the axes.
+    :param measure_text: stack the bars using the measured extents of their labels, see
+      :func:`get_text_heights`.
+    :param text_args: other arguments of the labels, used to measure them.
+    :rtype: BarLayout
+    """
+    if not isinstance(leveled_annotations, AnnotationTable):
+        leveled_annotations = AnnotationTable(
+            None,
+            None,
+            [annotation[3] for annotation in leveled_annotations],
+            start=[annotation[0] for annotation in leveled_annotations],
+            end=[annotation[1] for annotation in leveled_annotations],
+            level=[annotation[2] for annotation in leveled_annotations],
+        )
+
+    if mode not in ("vertical", "horizontal"):
+        raise ValueError("mode must be either 'vertical' or 'horizontal' :)")
+    geometry = get_geometry(ax)
+    annot_axis = 1 if mode == "vertical" else 0
+    annot_lim = geometry.get_lim(mode)[1]
+    cross_lim = geometry.get_cross_lim(mode)
+    other_lim = cross_lim[1] - cross_lim[0]
+    if placement not in PLACEMENTS:
+        raise ValueError(
+            f"placement must be one of {', '.join(map(repr, PLACEMENTS))}."
+        )
+    if baseline is None and placement == "data":
+        if isinstance(ax, AxesGeometry):
+            raise ValueError(
+                "The 'data' placement needs the axes of the plot, or a baseline."
+            )
+        baseline = get_data_baseline(ax, leveled_annotations, mode)
+    if baseline is not None:
+        annot_lim = baseline
+
+    labels, ns = label_pvalues(leveled_annotations.pvalue, thresholds)
+    shown = np.ones(len(labels), dtype=bool) if ns_show else ~ns
+    start = leveled_annotations.start[shown]
+    end = leveled_annotations.end[shown]
+    level = leveled_annotations.level[shown]
+    count = len(start)
+    if np.ndim(annot_lim):
+        annot_lim = np.asarray(annot_lim)[shown]
+
+    px_ax = geometry.get_pixels(mode)
+    text_height = get_text_heights(
+        geometry, labels[shown], mode, fontsize, measure_text, text_args
+    )
+
+    # Points are built as (cross, annot) pairs and flipped into (x, y) for horizontal plots
+    flip = slice(None, None, -1 if annot_axis == 0 else 1)
+
+    # Transform the box edges to pixels
+    gap = h_gap * other_lim / 2
+    coords = np.empty((2 * count, 2))
+    coords[:count, 0] = start + gap
+    coords[count:, 0] = end - gap
+    coords[:count, 1] = annot_lim
+    coords[count:, 1] = annot_lim
+    if transform is None:
+        transform = geometry.transform
+    px = transform.transform(coords[:, flip])[:, flip]
+    box1_px = px[:count, 0]
+    box2_px = px[count:, 0]
+
+    # Take annot axis limit maximum and add the first bar gap in axis pixels as starting point
+    annot_px = px[:count, 1] + px_ax * bar_gap
+    level_offset = px_ax * (bar_gap + tip_length + text_distance + text_height)
+    if placement == "data":
+        offset = stack_bars(start, end, annot_px, level_offset)
+    else:
+        offset = annot_px + get_level_offsets(level, level_offset)
+    tip = offset + px_ax * tip_length
+    text = tip + px_ax * text_distance
+    if measure_text:
+        # Measured labels are centered on their own extent, above the text distance
+        text = text + px_ax * text_height / 2
+
+    # Bracket corners followed by the text anchors, transformed back in one go
+    px = np.empty((5 * count, 2))
+    px[: 4 * count, 0] = np.column_stack([box1_px, box1_px, box2_px, box2_px]).ravel()
+    px[: 4 * count, 1] = np.column_stack([offset, tip, tip, offset]).ravel()
+    px[4 * count :, 0] = (box1_px + box2_px) / 2
+    px[4 * count :, 1] = text
+    coords = transform.inverted().transform(px[:, flip])
+
+    return BarLayout(
+        x=coords[: 4 * count, 0].reshape(count, 4),
+        y=coords[: 4 * count, 1].reshape(count, 4),
+        text_x=coords[4 * count :, 0],
+        text_y=coords[4 * count :, 1],
+        level=level,
+        index=leveled_annotations.index[shown],
+        labels=labels[shown],
+    )
+
+
+def get_data_baseline(ax, leveled_annotations, mode):
+    """
+    Return the top of the data under each annotation, or the lower limit of the annotated
+    axis where there is no data.
+    """
+    tops = DataExtentIndex(ax, mode).query(
+        leveled_annotations.start, leveled_annotations.end
+    )
+    lower = (ax.get_ylim() if mode == "vertical" else ax.get_xlim())[0]
+    return np.where(np.isnan(tops), lower, tops)
+
+
+def get_fitted_limits(
+    ax,
+    leveled_annotations,
+    baseline,
+    mode="vertical",
+    placement="top",
+    top_margin=0.05,
+    bar_gap=0.03,
+    tip_length=0.03,
+    text_distance=0.02,
+    fontsize=10,
+    thresholds=None,
+    measure_text=False,
+    text_args=None,
+):
+    """
+    Return the limits of the annotated axis that fit all the bars, with `top_margin` left
+    above the last one.
+
+    For the 'top' placement the upper limit is solved in one step from the number of levels.
+    For the 'data' placement bars of different heights may end up on top, so the largest
+    fitting scale of the data is bisected instead, stacking the bars once per step.
+
+    :param ax: the axes, or its :class:`AxesGeometry`.
+    :returns: the new limits, or the current limits if the bars already fit.
+    """
+    geometry = get_geometry(ax)
+    lower, upper = geometry.get_lim(mode)
+    if not len(leveled_annotations.level):
+        return lower, upper
+
+    # Work in the scaled space of the axis, where axes fractions are linear
+    scale = geometry.get_scale(mode)
+    scaled_lower, scaled_upper = scale.transform([lower, upper])
+    labels = label_pvalues(leveled_annotations.pvalue, thresholds)[0]
+    text_height = get_text_heights(
+        geometry, labels, mode, fontsize, measure_text, text_args
+    )
+    level_height = bar_gap + tip_length + text_distance + text_height
+    room = 1 - top_margin
+
+    if placement == "data":
+        bases = (np.asarray(scale.transform(baseline)) - scaled_lower) / (
+            scaled_upper - scaled_lower
+        )
+
+        def top(ratio):
+            # Axes fraction of the last bar when the current range takes `ratio` of the axes
+            offsets = stack_bars(
+                leveled_annotations.start,
+                leveled_annotations.end,
+                bases * ratio + bar_gap,
+                level_height,
+            )
+            return np.max(offsets + level_height)
+
+        if top(1) <= room:
+            return lower, upper
+        if top(0) >= room:
+            ratio = None
+        else:
+            low, high = 0.0, 1.0
+            for _ in range(40):
+                ratio = (low + high) / 2
+                low, high = (ratio, high) if top(ratio) <= room else (low, ratio)
+            ratio = low
+    else:
+        base = (scale.transform([baseline])[0] - scaled_lower) / (
+            scaled_upper - scaled_lower
+        )
+        level = leveled_annotations.level
+        height = bar_gap + np.max(get_level_offsets(level, level_height) + level_height)
+        ratio = (room - height) / base if room > height and base > 0 else None
+        if ratio is not None and ratio >= 1:
+            return lower, upper
+
+    if ratio is None:
+        logging.getLogger(LOGGER_NAME).warning(
+            "The annotations don't fit in the axes, reduce their spacing or top_margin."
+        )
+        return lower, upper
+    scaled_top = scaled_lower + (scaled_upper - scaled_lower) / ratio
+    return lower, scale.inverted().transform([scaled_top])[0]
+
+
+def get_limits_transform(ax, mode, limits):
+    """
+    Return the transformation from data to pixels that `ax` would have with `limits` on its
+    annotated axis.
+    """
+    return get_geometry(ax).get_transform(mode, limits)
@@ -0,0 +1,71 @@
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+STAGES = (
+    "filtering",
+    "positions",
+    "cache",
+    "leveling",
+    "limits",
+    "geometry",
+    "artists",
+)
+
+
+class StageStats:
+    """
+    Wall time and number of calls of each stage of drawing the annotations of one axes.
+
+    The stages are 'filtering' of the annotations, resolving their 'positions', reading and
+    writing the layout 'cache', 'leveling' them, fitting the axis 'limits', calculating
+    their 'geometry' and creating the 'artists'. Stages that didn't run, such as the layout
+    of annotations read from the cache, are left out.
+
+    :ivar times: dictionary mapping each stage to its total wall time, in seconds.
+    :ivar counts: dictionary mapping each stage to its number of calls.
+    """
+
+    def __init__(self):
+        self.times = {}
+        self.counts = {}
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager that adds the time spent in its block to the stage `name`.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + perf_counter() - start
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    @property
+    def total(self):
+        """
+        Total wall time of all stages, in seconds.
+        """
+        return sum(self.times.values())
+
+    def __repr__(self):
+        stages = ", ".join(
+            f"{name}={self.times[name] * 1000:.3f}ms x{self.counts[name]}"
+            for name in sorted(self.times, key=_stage_order)
+        )
+        return f"StageStats({stages})"
+
+
+def _stage_order(name):
+    return STAGES.index(name) if name in STAGES else len(STAGES)
+
+
+class _NullStats:
+    # Stands in for `StageStats` when profiling is off, timing nothing
+    _context = nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+
+NULL_STATS = _NullStats()
@@ -0,0 +1,173 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ._utils import parse_pvalues
+
+TESTS = ("t-test", "welch", "mann-whitney")
+CORRECTIONS = ("bonferroni", "holm", "fdr_bh")
+
+
+def _import_scipy_stats():
+    try:
+        import scipy.stats
+    except ImportError:
+        raise ImportError(
+            "Statistical tests require scipy, install it with `pip install scipy`."
+        ) from None
+    return scipy.stats
+
+
+def get_samples(data, group=None, value=None):
+    """
+    Return the samples of each group as a dictionary of float arrays, without NaN values.
+
+    :param data: dictionary of samples per group, or a long-format DataFrame.
+    :param group: column of the DataFrame holding the group labels.
+    :param value: column of the DataFrame holding the values.
+    """
+    if hasattr(data, "groupby"):
+        if group is None or value is None:
+            raise ValueError(
+                "Pass the `group` and `value` columns to test a long-format DataFrame."
+            )
+        data = {
+            label: samples.to_numpy()
+            for label, samples in data.groupby(group, sort=False, observed=True)[value]
+        }
+    samples = {}
+    for label, values in data.items():
+        values = np.asarray(values, dtype=float).reshape(-1)
+        samples[label] = values[~np.isnan(values)]
+    return samples
+
+
+def _ttest(samples, first, second, equal_var):
+    stats = _import_scipy_stats()
+    n = np.array([len(values) for values in samples], dtype=float)
+    mean = np.array([values.mean() if len(values) else np.nan for values in samples])
+    var = np.array(
+        [values.var(ddof=1) if len(values) > 1 else np.nan for values in samples]
+    )
+
+    n1, n2 = n[first], n[second]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if equal_var:
+            df = n1 + n2 - 2
+            pooled = ((n1 - 1) * var[first] + (n2 - 1) * var[second]) / df
+            se = np.sqrt(pooled * (1 / n1 + 1 / n2))
+        else:
+            v1, v2 = var[first] / n1, var[second] / n2
+            se = np.sqrt(v1 + v2)
+            df = (v1 + v2) ** 2 / (v1**2 / (n1 - 1) + v2**2 / (n2 - 1))
+        t = (mean[first] - mean[second]) / se
+    return 2 * stats.t.sf(np.abs(t), df)
+
+
+def _mannwhitney_pairs(pairs):
+    stats = _import_scipy_stats()
+    return [stats.mannwhitneyu(x, y).pvalue for x, y in pairs]
+
+
+def _mannwhitney(samples, first, second, processes):
+    stats = _import_scipy_stats()
+    if not len(first):
+        return np.array([])
+    sizes = {len(values) for values in samples}
+    if len(sizes) == 1 and sizes.pop() > 8:
+        # Equal sample sizes: test every pair in one call along the last axis. scipy picks
+        # the exact or asymptotic method once per call, and only picks the exact one for
+        # samples of at most 8, so larger samples get the same method as pair by pair
+        stacked = np.array(samples)
+        return np.asarray(
+            stats.mannwhitneyu(
+                stacked[first], stacked[second], axis=-1, method="asymptotic"
+            ).pvalue
+        )
+
+    pairs = [(samples[i], samples[j]) for i, j in zip(first, second)]
+    if not processes or len(pairs) < 2:
+        return np.array(_mannwhitney_pairs(pairs))
+    chunk = -(-len(pairs) // processes)
+    chunks = [pairs[i : i + chunk] for i in range(0, len(pairs), chunk)]
+    with ProcessPoolExecutor(processes) as executor:
+        return np.concatenate([*executor.map(_mannwhitney_pairs, chunks)])
+
+
+def pairwise_tests(data, test="t-test", group=None, value=None, processes=None):
+    """
+    Test every pair of groups and return the annotations to draw.
+
+    The t-tests are computed for all pairs at once from the moments of each group, and the
+    Mann-Whitney U tests are vectorized over pairs when all groups have the same size of more
+    than 8, where scipy uses the asymptotic method for every pair.
+    NaN values are left out of the samples.
+
+    :param data: dictionary of samples per group, or a long-format DataFrame with one row per
+      observation.
+    :param test: 't-test' for Student's t-test, 'welch' for Welch's t-test or 'mann-whitney'
+      for the Mann-Whitney U test, all two-sided. Default is 't-test'.
+    :param group: column of the DataFrame holding the group labels.
+    :param value: column of the DataFrame holding the values.
+    :param processes: number of worker processes used for Mann-Whitney U tests between groups
+      of different sizes. Default is to run them in the current process.
+    :returns: list of tuples containing the group labels and the p-value of each pair, ready
+      to pass to :func:`~starbars.draw_annotation`.
+    :rtype: list[tuple[str, str, float]]
+    """
+    if test not in TESTS:
+        raise ValueError(f"test must be one of {', '.join(map(repr, TESTS))}.")
+
+    samples = get_samples(data, group, value)
+    labels = list(samples.keys())
+    first, second = np.triu_indices(len(labels), 1)
+    samples = list(samples.values())
+
+    if test == "mann-whitney":
+        pvalues = _mannwhitney(samples, first, second, processes)
+    else:
+        pvalues = _ttest(samples, first, second, equal_var=test == "t-test")
+
+    return [
+        (labels[i], labels[j], pvalue)
+        for i, j, pvalue in zip(first, second, pvalues.tolist())
+    ]
+
+
+def adjust_pvalues(pvalues, method):
+    """
+    Correct p-values for multiple comparisons.
+
+    Sorting the p-values once makes every method O(n log n). Labels that can't be read as a
+    number are passed through and NaN values are not counted as comparisons.
+
+    :param pvalues: p-values, as a sequence, NumPy array or pandas Series.
+    :param method: 'bonferroni' for the Bonferroni correction, 'holm' for the Holm-Bonferroni
+      method or 'fdr_bh' for the Benjamini-Hochberg false discovery rate.
+    :returns: the adjusted p-values, as a float array, or as an object array if some of the
+      p-values are labels.
+    """
+    if method not in CORRECTIONS:
+        raise ValueError(f"method must be one of {', '.join(map(repr, CORRECTIONS))}.")
+
+    values, numeric = parse_pvalues(pvalues)
+    tested = np.flatnonzero(~np.isnan(values))
+    count = len(tested)
+    order = tested[np.argsort(values[tested], kind="stable")]
+    ranked = values[order]
+
+    if method == "bonferroni":
+        ranked = ranked * count
+    elif method == "holm":
+        ranked = np.maximum.accumulate(ranked * np.arange(count, 0, -1))
+    else:
+        ranked = np.minimum.accumulate((ranked * count / np.arange(1, count + 1))[::-1])
+        ranked = ranked[::-1]
+
+    adjusted = values.copy()
+    adjusted[order] = np.minimum(ranked, 1)
+    if numeric.all():
+        return adjusted
+    result = np.asarray(pvalues, dtype=object).reshape(-1).copy()
+    result[numeric] = adjusted[numeric]
+    return result
@@ -0,0 +1,122 @@
+from collections.abc import Sized
+from itertools import islice
+
+import numpy as np
+
+from ._stats import adjust_pvalues
+from ._table import AnnotationTable
+from ._utils import filter_annotations, label_pvalues, parse_pvalues
+
+CHUNK_SIZE = 4096
+
+
+def is_stream(annotations):
+    """
+    Return whether the annotations are read lazily, as an iterable without a length such as
+    a generator.
+    """
+    return not isinstance(annotations, Sized)
+
+
+def prepare_annotations(
+    annotations,
+    ns_show=True,
+    thresholds=None,
+    predicate=None,
+    top_k=None,
+    correction=None,
+):
+    """
+    Correct the p-values of the annotations and drop those that won't be drawn, before any
+    geometry work.
+
+    See :func:`~starbars._utils.filter_annotations` for the parameters.
+
+    :param annotations: list of tuples containing the box labels and the p-value of the
+      pair, an :class:`~starbars.AnnotationTable`, or an iterator of tuples read with
+      :func:`filter_annotation_stream`.
+    :returns: the table of the kept annotations, whose `index` is their position in
+      `annotations`, and the number of annotations.
+    """
+    if is_stream(annotations):
+        return filter_annotation_stream(
+            annotations, ns_show, thresholds, predicate, top_k, correction
+        )
+    annotations = AnnotationTable.from_annotations(annotations)
+    if correction is not None:
+        annotations = annotations.with_pvalues(
+            adjust_pvalues(annotations.pvalue, correction)
+        )
+    count = len(annotations)
+    return (
+        filter_annotations(annotations, ns_show, thresholds, predicate, top_k)[0],
+        count,
+    )
+
+
+def filter_annotation_stream(
+    annotations,
+    ns_show=True,
+    thresholds=None,
+    predicate=None,
+    top_k=None,
+    correction=None,
+    chunk_size=CHUNK_SIZE,
+):
+    """
+    Drop the annotations that won't be drawn while reading them, one chunk at a time.
+
+    Only the annotations that pass the filters are kept from each chunk, so memory grows with
+    the number of annotations drawn rather than tested. Correcting the p-values needs all of
+    them though: they are kept as floats, and the predicate and `top_k` are applied to the
+    corrected p-values once every annotation is read.
+
+    See :func:`~starbars._utils.filter_annotations` for the parameters.
+
+    :param annotations: iterable of tuples containing the box labels and the p-value of the
+      pair.
+    :param correction: method used to correct the p-values, see
+      :func:`~starbars.adjust_pvalues`.
+    :param chunk_size: number of annotations read at once.
+    :returns: the table of the kept annotations, whose `index` is their position in
+      `annotations`, and the number of annotations read.
+    """
+    annotations = iter(annotations)
+    kept = []
+    pvalues = []
+    count = 0
+    while True:
+        chunk = AnnotationTable.from_annotations(islice(annotations, chunk_size))
+        if not len(chunk):
+            break
+        chunk.index += count
+        count += len(chunk)
+
+        if correction is not None:
+            pvalues.append(parse_pvalues(chunk.pvalue)[0])
+            # Corrections never lower a p-value, so non-significant ones stay so
+            if not ns_show:
+                chunk = chunk.take(~label_pvalues(chunk.pvalue, thresholds)[1])
+            kept.append(chunk)
+        elif top_k is None:
+            kept.append(filter_annotations(chunk, ns_show, thresholds, predicate)[0])
+        else:
+            # The best of the previous chunks come first, so ties keep the earliest
+            chunk = filter_annotations(chunk, ns_show, thresholds, predicate, top_k)[0]
+            kept = [
+                filter_annotations(
+                    AnnotationTable.concatenate([*kept, chunk]), top_k=top_k
+                )[0]
+            ]
+
+    if not kept:
+        return AnnotationTable.from_annotations([]), count
+    table = AnnotationTable.concatenate(kept)
+    if correction is not None:
+        adjusted = adjust_pvalues(np.concatenate(pvalues), correction)
+        numeric = parse_pvalues(table.pvalue)[1]
+        table = table.with_pvalues(
+            np.where(numeric, adjusted[table.index], table.pvalue)
+        )
+        table = filter_annotations(table, ns_show, thresholds, predicate, top_k)[0]
+    return table, count
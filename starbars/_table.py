@@ -0,0 +1,195 @@
+from operator import itemgetter
+
+import numpy as np
+
+
+def _to_objects(values):
+    # Boxes may be `(hue, group)` tuples, which NumPy would otherwise unpack into columns
+    if isinstance(values, np.ndarray) and values.ndim == 1:
+        return values
+    values = values if isinstance(values, (list, tuple, np.ndarray)) else [*values]
+    return np.fromiter(values, dtype=object, count=len(values))
+
+
+def _to_pvalues(values):
+    try:
+        return np.asarray(values, dtype=float).reshape(-1)
+    except (TypeError, ValueError):
+        # Keep labels such as "ns" next to the numbers
+        return _to_objects(values)
+
+
+class AnnotationTable:
+    """
+    Statistical annotations as parallel arrays, with one row per pair of boxes.
+
+    Every stage of laying out the annotations takes and returns a table: filtering keeps
+    some of its rows, and leveling fills in the positions and stacking level of each pair
+    and sorts the rows by level. Iterating over a table gives `(box1, box2, pvalue)` tuples,
+    so that it can be used wherever a list of annotations is expected.
+
+    Hue boxes are either `(hue, group)` tuples in `box1` and `box2`, or groups in `box1` and
+    `box2` with their hues in the separate `hue1` and `hue2` columns, as read by
+    :meth:`from_columns`.
+
+    :param box1: label, or `(hue, group)` tuple, of the first box of each pair.
+    :param box2: label, or `(hue, group)` tuple, of the second box of each pair.
+    :param pvalue: p-value, or label, of each pair.
+    :param index: position of each row in the original annotations. Default is the number of
+      the row.
+    :param start: lower position of each pair on the cross axis, once resolved.
+    :param end: upper position of each pair on the cross axis, once resolved.
+    :param level: stacking level of each pair, once leveled.
+    :param hue1: hue of the first box of each pair, if `box1` holds only its group.
+    :param hue2: hue of the second box of each pair, if `box2` holds only its group.
+    """
+
+    __slots__ = (
+        "box1",
+        "box2",
+        "hue1",
+        "hue2",
+        "pvalue",
+        "index",
+        "start",
+        "end",
+        "level",
+    )
+
+    def __init__(
+        self,
+        box1,
+        box2,
+        pvalue,
+        index=None,
+        start=None,
+        end=None,
+        level=None,
+        hue1=None,
+        hue2=None,
+    ):
+        if (hue1 is None) != (hue2 is None):
+            raise ValueError("Hue boxes need both the hue1 and hue2 columns.")
+        self.pvalue = _to_pvalues(pvalue)
+        count = len(self.pvalue)
+        self.box1 = None if box1 is None else _to_objects(box1)
+        self.box2 = None if box2 is None else _to_objects(box2)
+        self.hue1 = None if hue1 is None else _to_objects(hue1)
+        self.hue2 = None if hue2 is None else _to_objects(hue2)
+        self.index = np.arange(count) if index is None else np.asarray(index, dtype=int)
+        self.start = None if start is None else np.asarray(start, dtype=float)
+        self.end = None if end is None else np.asarray(end, dtype=float)
+        self.level = None if level is None else np.asarray(level, dtype=int)
+
+    @classmethod
+    def from_columns(cls, data):
+        """
+        Return the table of annotations stored by column, such as in a pandas
+        ``DataFrame`` or a dictionary of arrays.
+
+        The columns are `group1`, `group2` and `pvalue`, and `hue1` and `hue2` for hue boxes.
+        They are used as arrays, without reading the rows one by one.
+
+        :raises ValueError: if a column is missing.
+        """
+        missing = [name for name in ("group1", "group2", "pvalue") if name not in data]
+        if missing:
+            raise ValueError(f"Missing annotation columns: {', '.join(missing)}.")
+
+        def column(name):
+            return np.asarray(data[name]).reshape(-1) if name in data else None
+
+        return cls(
+            column("group1"),
+            column("group2"),
+            column("pvalue"),
+            hue1=column("hue1"),
+            hue2=column("hue2"),
+        )
+
+    @classmethod
+    def from_annotations(cls, annotations):
+        """
+        Return the table of a list of `(box1, box2, pvalue)` tuples, of columns of annotations
+        read with :meth:`from_columns`, or the table itself.
+
+        :raises ValueError: if an annotation doesn't have exactly 3 values.
+        """
+        if isinstance(annotations, cls):
+            return annotations
+        if hasattr(annotations, "keys"):
+            return cls.from_columns(annotations)
+        if not isinstance(annotations, (list, tuple)):
+            annotations = [*annotations]
+        if set(map(len, annotations)) - {3}:
+            raise ValueError(
+                "Annotations must be (box1, box2, pvalue) tuples, or an AnnotationTable."
+            )
+        # Read the columns straight into arrays, without a tuple per column on the way
+        box1, box2, pvalue = (
+            map(itemgetter(column), annotations) for column in range(3)
+        )
+        count = len(annotations)
+        try:
+            pvalue = np.fromiter(pvalue, dtype=float, count=count)
+        except (TypeError, ValueError):
+            pvalue = [annotation[2] for annotation in annotations]
+        return cls(
+            np.fromiter(box1, dtype=object, count=count),
+            np.fromiter(box2, dtype=object, count=count),
+            pvalue,
+        )
+
+    @classmethod
+    def concatenate(cls, tables):
+        """
+        Return the table of the rows of all `tables`, in order.
+        """
+        table = cls.__new__(cls)
+        for name in cls.__slots__:
+            columns = [getattr(part, name) for part in tables]
+            if any(column is None for column in columns):
+                setattr(table, name, None)
+            else:
+                setattr(table, name, np.concatenate(columns))
+        return table
+
+    def __len__(self):
+        return len(self.pvalue)
+
+    def __iter__(self):
+        if self.hue1 is None:
+            return zip(self.box1, self.box2, self.pvalue)
+        return zip(zip(self.hue1, self.box1), zip(self.hue2, self.box2), self.pvalue)
+
+    def __getitem__(self, key):
+        if not isinstance(key, (int, np.integer)):
+            return self.take(key)
+        if self.hue1 is None:
+            return self.box1[key], self.box2[key], self.pvalue[key]
+        return (
+            (self.hue1[key], self.box1[key]),
+            (self.hue2[key], self.box2[key]),
+            self.pvalue[key],
+        )
+
+    def __repr__(self):
+        return f"AnnotationTable({len(self)} annotations)"
+
+    def take(self, rows):
+        """
+        Return a table of the given rows, as indices or a boolean mask.
+        """
+        table = AnnotationTable.__new__(AnnotationTable)
+        for name in self.__slots__:
+            column = getattr(self, name)
+            setattr(table, name, None if column is None else column[rows])
+        return table
+
+    def with_pvalues(self, pvalue):
+        """
+        Return a copy of the table with other p-values.
+        """
+        table = self.take(slice(None))
+        table.pvalue = _to_pvalues(pvalue)
+        return table
@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib.text import Text
+
+
+class TextMetricsCache:
+    """
+    Least recently used cache of the rendered size of labels.
+
+    Sizes are keyed on the label, font properties, DPI and rotation, so each distinct label
+    is measured through the renderer only once, however many bars or figures show it. The
+    cache and its renderers may be shared by threads.
+
+    :param maxsize: maximum number of sizes kept in the cache.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._sizes = OrderedDict()
+        self._renderers = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def clear(self):
+        with self._lock:
+            self._sizes.clear()
+            self._renderers.clear()
+
+    def _get_renderer(self, dpi):
+        renderer = self._renderers.get(dpi)
+        if renderer is None:
+            from matplotlib.backends.backend_agg import RendererAgg
+
+            renderer = self._renderers[dpi] = RendererAgg(1, 1, dpi)
+        return renderer
+
+    def measure(self, figure, labels, fontsize=10, rotation=0, text_args=None):
+        """
+        Return the width and height in pixels of the bounding box of each label.
+
+        :param figure: the figure the labels are drawn on, which sets the DPI.
+        :param labels: the labels to measure.
+        :param text_args: other arguments of the :class:`~matplotlib.text.Text` of the labels.
+        :returns: an array with one `(width, height)` row per label.
+        """
+        text = Text(text="", fontsize=fontsize, rotation=rotation, **(text_args or {}))
+        text.set_figure(figure)
+        font = text.get_fontproperties()
+        dpi = figure.dpi
+
+        sizes = np.empty((len(labels), 2))
+        with self._lock:
+            for index, label in enumerate(labels):
+                key = (label, font, dpi, rotation)
+                size = self._sizes.get(key)
+                if size is None:
+                    text.set_text(label)
+                    extent = text.get_window_extent(self._get_renderer(dpi), dpi=dpi)
+                    size = self._sizes[key] = (extent.width, extent.height)
+                    if len(self._sizes) > self.maxsize:
+                        self._sizes.popitem(last=False)
+                else:
+                    self._sizes.move_to_end(key)
+                sizes[index] = size
+        return sizes
+
+
+TEXT_METRICS = TextMetricsCache()
+
+
+def get_font_key(fontsize=10, text_args=None):
+    """
+    Return the font properties of the labels and the font file they resolve to, which
+    change with the font settings of ``rcParams`` as well as with `text_args`.
+    """
+    from matplotlib.font_manager import findfont
+
+    font = Text(text="", fontsize=fontsize, **(text_args or {})).get_fontproperties()
+    return str(font), findfont(font)
+
+
+def get_text_extents(figure, labels, fontsize=10, mode="vertical", text_args=None):
+    """
+    Return the extent in pixels of each label across and along the annotated axis, as they
+    are drawn for `mode`.
+
+    :returns: the extents across the annotated axis and the extents along it.
+    """
+    if mode == "vertical":
+        sizes = TEXT_METRICS.measure(figure, labels, fontsize, 0, text_args)
+        return sizes[:, 0], sizes[:, 1]
+    sizes = TEXT_METRICS.measure(figure, labels, fontsize, -90, text_args)
+    return sizes[:, 1], sizes[:, 0]
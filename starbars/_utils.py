@@ -1,9 +1,15 @@
 import itertools
 import logging
+import numbers
 
 import numpy as np
+from matplotlib.collections import Collection, PathCollection
+from matplotlib.colors import is_color_like, same_color, to_rgba_array
 from matplotlib.patches import PathPatch
 
+from ._profile import NULL_STATS
+from ._table import AnnotationTable
+
 
 def check_tuples(x1, x2):
     # Check if both x1 and x2 are tuples or neither are tuples
@@ -17,108 +23,540 @@ def check_tuples(x1, x2):
     return True
 
 
-def pvalue_to_asterisks(pvalue):
-    try:
-        pvalue = float(pvalue)
-    except ValueError:
-        return pvalue
+DEFAULT_THRESHOLDS = (
+    (0.0001, "****"),
+    (0.001, "***"),
+    (0.01, "**"),
+    (0.05, "*"),
+    (np.inf, "ns"),
+)
+
+
+def check_thresholds(thresholds):
+    """
+    Validate a threshold table and return its cutoffs and labels as arrays.
+
+    A table is a sequence of `(cutoff, label)` rows in ascending order of cutoff, and
+    p-values are labelled by the first row whose cutoff they do not exceed. The last row
+    labels non-significant p-values, and is added as `(inf, "ns")` when the table does not
+    end with an infinite cutoff.
+    """
+    if thresholds is None:
+        thresholds = DEFAULT_THRESHOLDS
+    cutoffs = np.array([cutoff for cutoff, _ in thresholds], dtype=float)
+    labels = np.array([label for _, label in thresholds] + ["ns"], dtype=object)
+    if np.any(np.diff(cutoffs) <= 0):
+        raise ValueError("Threshold cutoffs must be in strictly ascending order.")
+    if not len(cutoffs) or cutoffs[-1] != np.inf:
+        cutoffs = np.append(cutoffs, np.inf)
     else:
-        if pvalue <= 0.0001:
-            return "****"
-        elif pvalue <= 0.001:
-            return "***"
-        elif pvalue <= 0.01:
-            return "**"
-        elif pvalue <= 0.05:
-            return "*"
-        else:
-            return "ns"
-
-
-def get_tick_position(ax, box1, box2, mode):
-    if mode == "vertical":
-        tick_positions = ax.get_xticks()
-        tick_labels = [tick.get_text() for tick in ax.get_xticklabels()]
-    else:
-        tick_positions = ax.get_yticks()
-        tick_labels = [tick.get_text() for tick in ax.get_yticklabels()]
-    try:
-        position1 = tick_positions[tick_labels.index(box1)]
-        position2 = tick_positions[tick_labels.index(box2)]
-    except ValueError:
-        position1 = box1
-        position2 = box2
+        labels = labels[:-1]
+    return cutoffs, labels
 
-    return position1, position2
 
+def parse_pvalues(pvalues):
+    """
+    Read p-values as floats.
 
-def get_positions(ax, box1, box2, mode):
+    :returns: the float values, NaN where the p-value can't be read as a number, and a mask
+      of the p-values that could.
+    """
     try:
-        if check_tuples(box1, box2):
-            pass
-    except ValueError as e:
-        print(f"Validation error: {e}")
-        exit()
+        # Always a copy, callers may write into the values
+        values = np.array(pvalues, dtype=float).reshape(-1)
+        numeric = np.ones(len(values), dtype=bool)
+    except (TypeError, ValueError):
+        # Mixed input, keep track of the labels that can't be read as a number
+        pvalues = np.asarray(pvalues, dtype=object).reshape(-1)
+        values = np.full(len(pvalues), np.nan)
+        numeric = np.zeros(len(pvalues), dtype=bool)
+        for i, pvalue in enumerate(pvalues):
+            try:
+                values[i] = float(pvalue)
+            except (TypeError, ValueError):
+                pass
+            else:
+                numeric[i] = True
+    return values, numeric
+
+
+def label_pvalues(pvalues, thresholds=None):
+    """
+    Label p-values through a threshold table.
+
+    :returns: the labels, and a mask of the non-significant p-values.
+    """
+    cutoffs, table_labels = check_thresholds(thresholds)
+    values, numeric = parse_pvalues(pvalues)
+
+    # NaN sorts past the last cutoff and is labelled as non-significant
+    tiers = np.minimum(np.searchsorted(cutoffs, values), len(cutoffs) - 1)
+    labels = table_labels[tiers]
+    for tier, label in enumerate(table_labels):
+        if isinstance(label, str) and "{" in label:
+            members = np.flatnonzero(tiers == tier)
+            labels[members] = [label.format(value) for value in values[members]]
+
+    ns = tiers == len(cutoffs) - 1
+    if not numeric.all():
+        labels[~numeric] = np.asarray(pvalues, dtype=object).reshape(-1)[~numeric]
+        ns[~numeric] = labels[~numeric] == "ns"
+    return labels, ns
+
+
+def pvalues_to_asterisks(pvalues, thresholds=None):
+    """
+    Convert an array of p-values to their labels in a single pass.
+
+    Values that can't be read as a number are passed through as labels.
+
+    :param pvalues: p-values, as a sequence, NumPy array or pandas Series.
+    :param thresholds: sequence of `(cutoff, label)` rows in ascending order of cutoff. A
+      p-value gets the label of the first row whose cutoff it does not exceed, and labels
+      may be format strings such as `"p = {:.3f}"` to show the p-value itself. Default is
+      the asterisk notation with cutoffs 0.0001, 0.001, 0.01 and 0.05.
+    :returns: an object array of labels.
+    """
+    return label_pvalues(pvalues, thresholds)[0]
+
+
+def pvalue_to_asterisks(pvalue, thresholds=None):
+    return pvalues_to_asterisks([pvalue], thresholds)[0]
+
+
+def filter_annotations(
+    annotations, ns_show=True, thresholds=None, predicate=None, top_k=None
+):
+    """
+    Drop the annotations that won't be drawn, before any position is resolved.
+
+    :param annotations: list of tuples containing the box labels and the p-value of the pair,
+      or an :class:`~starbars.AnnotationTable`.
+    :param ns_show: whether to keep non-significant annotations.
+    :param thresholds: threshold table deciding which p-values are non-significant.
+    :param predicate: function called with the box labels and p-value of each annotation,
+      which returns whether to keep it.
+    :param top_k: keep only the `top_k` annotations with the lowest p-values.
+    :returns: the table of the kept annotations, and their indices in `annotations`.
+    """
+    annotations = AnnotationTable.from_annotations(annotations)
+    keep = np.ones(len(annotations), dtype=bool)
+    if not ns_show:
+        keep &= ~label_pvalues(annotations.pvalue, thresholds)[1]
+    if predicate is not None:
+        keep &= np.fromiter(
+            (bool(predicate(*annotation)) for annotation in annotations),
+            dtype=bool,
+            count=len(annotations),
+        )
+    if top_k is not None:
+        # Labels and NaN values sort after every p-value
+        values = parse_pvalues(annotations.pvalue)[0]
+        # Rank only the annotations that are still kept
+        kept = np.flatnonzero(keep)
+        ranked = kept[np.argsort(values[kept], kind="stable")[: max(top_k, 0)]]
+        keep[:] = False
+        keep[ranked] = True
+
+    kept = np.flatnonzero(keep)
+    if len(kept) == len(annotations):
+        return annotations, kept
+    return annotations.take(kept), kept
+
+
+class PositionResolver:
+    """
+    Resolve annotation boxes to their positions along the cross axis of a plot.
+
+    The tick labels, the legend and the boxes of the hues are scanned once on creation, so
+    that every subsequent lookup is a dictionary access instead of a new scan of the axes.
+
+    The boxes of each hue are read from the containers of the axes, such as the bars of a
+    barplot or the boxes of a boxplot, or from their collections, such as the bodies of a
+    violinplot or the points of a dodged stripplot, and are assigned to the group of the
+    nearest tick. Plots drawn otherwise fall back on splitting the patches of the axes
+    evenly between the hues.
+
+    :param ax: The axes containing the plotted data.
+    :type ax: matplotlib.axes.Axes
+    :param mode: orientation of the data representation, 'horizontal' or 'vertical'.
+    """
+
+    def __init__(self, ax, mode):
+        self.mode = mode
+        if mode == "vertical":
+            tick_positions = ax.get_xticks()
+            tick_labels = [tick.get_text() for tick in ax.get_xticklabels()]
+        else:
+            tick_positions = ax.get_yticks()
+            tick_labels = [tick.get_text() for tick in ax.get_yticklabels()]
+
+        # Keep the first position of duplicated labels, like `list.index` would.
+        self.tick_positions = {}
+        for label, position in zip(tick_labels, tick_positions):
+            self.tick_positions.setdefault(label, position)
 
-    if isinstance(box1, tuple) and isinstance(box2, tuple):
-        box1, group1 = box1
-        box2, group2 = box2
         legend = ax.get_legend()
+        hue_handles = {}
         if legend:
-            hue_labels = [text.get_text() for text in legend.get_texts()]
-            hue_count = len(hue_labels)
-            # Calculate amount of groups: (n_patches - legend_patches) / n_hues
-            group_count = (len(ax.patches) - hue_count) // hue_count
-            patch_to_hue = [
-                *itertools.chain.from_iterable(
-                    [label] * group_count for label in hue_labels
+            hue_handles = dict(
+                zip(
+                    [text.get_text() for text in legend.get_texts()],
+                    _get_legend_handles(legend),
                 )
-            ]
+            )
+        self.hue_lists = self._scan_hue_artists(ax, mode, hue_handles)
+        if not self.hue_lists:
+            self.hue_lists = self._scan_hues(ax, mode, [*hue_handles])
+        self.hue_positions = {
+            (hue_label, label): box
+            for hue_label, positions in self.hue_lists.items()
+            for label, position in self.tick_positions.items()
+            if (box := _get_hue_box(positions, position)) is not None
+        }
+
+    @classmethod
+    def from_positions(cls, positions, mode="vertical"):
+        """
+        Return a resolver for known box positions, without scanning any axes.
+
+        :param positions: mapping of each box label, or `(hue, group)` tuple, to its position
+          on the cross axis.
+        """
+        resolver = cls.__new__(cls)
+        resolver.mode = mode
+        resolver.tick_positions = {
+            box: position
+            for box, position in positions.items()
+            if not isinstance(box, tuple)
+        }
+        resolver.hue_lists = {}
+        resolver.hue_positions = {
+            box: position
+            for box, position in positions.items()
+            if isinstance(box, tuple)
+        }
+        return resolver
+
+    def _scan_hue_artists(self, ax, mode, hue_handles):
+        # One container per hue, in the order of the legend unless they are labelled
+        containers = [
+            container
+            for container in ax.containers
+            if getattr(container, "patches", None) or getattr(container, "boxes", None)
+        ]
+        hue_artists = []
+        if containers:
+            labels = [container.get_label() for container in containers]
+            if not set(labels) <= set(hue_handles):
+                if len(containers) != len(hue_handles):
+                    return {}
+                labels = [*hue_handles]
+            for label, container in zip(labels, containers):
+                boxes = getattr(container, "patches", None) or container.boxes
+                hue_artists.extend((label, box) for box in boxes)
+        else:
+            # One collection per box, such as violins or dodged strips, matched by color
+            for collection in ax.collections:
+                colors = _get_colors(collection)
+                # Collections of several hues, like undodged strips, have no single box
+                if not len(colors) or (colors != colors[0]).any():
+                    continue
+                color = colors[0]
+                for label, handle in hue_handles.items():
+                    if same_color(color, _get_handle_color(handle)):
+                        hue_artists.append((label, collection))
+                        break
+
+        ticks = [
+            position
+            for position in self.tick_positions.values()
+            if isinstance(position, numbers.Real)
+        ]
+        if not hue_artists or not ticks:
+            return {}
+        hue_lists = {label: {} for label in hue_handles}
+        for label, artist in hue_artists:
+            center = _get_center(artist, mode)
+            if np.isnan(center):
+                continue
+            group = min(ticks, key=lambda tick: abs(tick - center))
+            hue_lists[label].setdefault(group, center)
+        return hue_lists
+
+    @staticmethod
+    def _scan_hues(ax, mode, hue_labels):
+        hue_count = len(hue_labels)
+        if not hue_count:
+            return {}
+        # Calculate amount of groups: (n_patches - legend_patches) / n_hues
+        group_count = (len(ax.patches) - hue_count) // hue_count
+        patch_to_hue = [
+            *itertools.chain.from_iterable(
+                [label] * group_count for label in hue_labels
+            )
+        ]
+
+        # Get the box positions and hue labels from the patches
+        bar_positions = {label: [] for label in hue_labels}
+        for i, patch in enumerate(ax.patches[: group_count * hue_count]):
+            hue_label = patch_to_hue[i]
+            bbox = (
+                patch.get_path().get_extents()
+                if isinstance(patch, PathPatch)
+                else patch.get_bbox()
+            )
+            if mode == "vertical":
+                position = bbox.x0 + (bbox.width / 2)
+            else:
+                position = bbox.y0 + (bbox.height / 2)
+            bar_positions[hue_label].append(
+                float(position) if isinstance(position, np.float64) else position
+            )
 
-            # Get the box positions and hue labels from the patches
-            bar_positions = {label: [] for label in hue_labels}
-            for i, patch in enumerate(ax.patches[: group_count * hue_count]):
-                hue_label = patch_to_hue[i]
-                bbox = (
-                    patch.get_path().get_extents()
-                    if isinstance(patch, PathPatch)
-                    else patch.get_bbox()
-                )
-                if mode == "vertical":
-                    bar_positions[hue_label].append(bbox.x0 + (bbox.width / 2))
-                else:
-                    bar_positions[hue_label].append(bbox.y0 + (bbox.height / 2))
-
-            # Clean up the positions
-            cleaned_positions = {
-                key: [
-                    float(value) if isinstance(value, np.float64) else value
-                    for value in values
-                ]
-                for key, values in bar_positions.items()
-            }
-
-            group1_position, group2_position = get_tick_position(
-                ax, group1, group2, mode
+        return bar_positions
+
+    def tick_position(self, box):
+        """
+        Return the position of the tick labelled `box`, or `box` itself when no tick has that label.
+
+        :raises ValueError: if no tick has the label `box` and it isn't a number either.
+        """
+        position = self.tick_positions.get(box, box)
+        if isinstance(position, str):
+            raise ValueError(f"Could not find a tick labelled '{box}' on the plot.")
+        return position
+
+    def hue_position(self, box):
+        """
+        Return the position of a `(hue, group)` box.
+        """
+        hue, group = box
+        try:
+            return self.hue_positions[box]
+        except (KeyError, TypeError):
+            pass
+        if hue not in self.hue_lists:
+            raise ValueError(
+                f"Could not find hue '{hue}' in the legend of the plot, "
+                "hue annotations require a legend listing the hue labels."
+            )
+        try:
+            position = _get_hue_box(self.hue_lists[hue], self.tick_position(group))
+        except TypeError:
+            position = None
+        if position is None:
+            raise ValueError(
+                f"Could not find the box of hue '{hue}' in group '{group}'."
+            )
+        return position
+
+    def get_positions(self, box1, box2):
+        """
+        Return the positions of a pair of boxes.
+
+        :raises ValueError: if only one of the boxes is a `(hue, group)` tuple.
+        """
+        check_tuples(box1, box2)
+        if isinstance(box1, tuple):
+            return self.hue_position(box1), self.hue_position(box2)
+        return self.tick_position(box1), self.tick_position(box2)
+
+    def get_position_arrays(self, box1, box2, hue1=None, hue2=None):
+        """
+        Return the lower and upper positions of each pair of boxes, as arrays.
+
+        The boxes are factorized by sorting them, such as the label columns of a DataFrame,
+        and each distinct box is resolved once, however many pairs it is part of.
+
+        :param box1: the first box of each pair.
+        :param box2: the second box of each pair.
+        :param hue1: hue of the first box of each pair, if `box1` holds only its group.
+        :param hue2: hue of the second box of each pair, if `box2` holds only its group.
+        :raises ValueError: if only one of the boxes of a pair is a `(hue, group)` tuple.
+        """
+        count = len(box1)
+        boxes, inverse = _factorize(_concatenate(box1, box2))
+        if hue1 is not None:
+            hues, hue_inverse = _factorize(_concatenate(hue1, hue2))
+            keys, inverse = np.unique(
+                hue_inverse * len(boxes) + inverse, return_inverse=True
+            )
+            resolved = [
+                self.hue_position((hues[key // len(boxes)], boxes[key % len(boxes)]))
+                for key in keys
+            ]
+        else:
+            is_hue = np.fromiter(
+                (isinstance(box, tuple) for box in boxes), bool, len(boxes)
             )
+            mismatched = is_hue[inverse[:count]] != is_hue[inverse[count:]]
+            if mismatched.any():
+                first = np.argmax(mismatched)
+                check_tuples(box1[first], box2[first])
+            resolved = [
+                self.hue_position(box) if hue else self.tick_position(box)
+                for box, hue in zip(boxes, is_hue)
+            ]
+
+        positions = np.asarray(resolved, dtype=float)[inverse.reshape(-1)]
+        first, second = positions[:count], positions[count:]
+        return np.minimum(first, second), np.maximum(first, second)
+
+
+def _concatenate(column1, column2):
+    # Columns of different types, like numbers and labels, are compared as objects
+    column1, column2 = np.asarray(column1), np.asarray(column2)
+    if column1.dtype != column2.dtype:
+        column1, column2 = column1.astype(object), column2.astype(object)
+    return np.concatenate([column1, column2])
+
+
+def _factorize(values):
+    """
+    Return the distinct values, and the index of each value among them.
+    """
+    try:
+        return np.unique(values, return_inverse=True)
+    except TypeError:
+        # Values that can't be sorted together, such as labels and numbers
+        codes = {}
+        inverse = np.fromiter(
+            (codes.setdefault(value, len(codes)) for value in values),
+            dtype=int,
+            count=len(values),
+        )
+        return np.fromiter(codes, dtype=object, count=len(codes)), inverse
+
 
-            position1 = cleaned_positions[box1][group1_position]
-            position2 = cleaned_positions[box2][group2_position]
+def _get_hue_box(positions, group_position):
+    # Hue boxes are listed in the order of the groups, or keyed by the position of their group
+    if isinstance(positions, dict):
+        return positions.get(group_position)
+    if _is_index(group_position, len(positions)):
+        return positions[int(group_position)]
+    return None
 
+
+def _get_legend_handles(legend):
+    # `legendHandles` was renamed in Matplotlib 3.7
+    return getattr(legend, "legend_handles", None) or legend.legendHandles
+
+
+def _get_colors(artist):
+    # Face colors of an artist, or its edge colors when it isn't filled, such as violins
+    # plotted with `fill=False`
+    if hasattr(artist, "get_markerfacecolor"):
+        colors = (artist.get_markerfacecolor(), artist.get_markeredgecolor())
     else:
-        position1, position2 = get_tick_position(ax, box1, box2, mode)
+        colors = (artist.get_facecolor(), artist.get_edgecolor())
+    for color in colors:
+        color = to_rgba_array(color)
+        if len(color) and color[:, 3].any():
+            return color
+    return np.zeros((0, 4))
+
+
+def _get_handle_color(handle):
+    colors = _get_colors(handle)
+    return colors[0] if len(colors) else "none"
+
+
+def _get_center(artist, mode):
+    # Center of an artist along the cross axis, in data coordinates
+    if isinstance(artist, PathCollection):
+        offsets = np.asarray(artist.get_offsets(), dtype=float)
+        if not len(offsets):
+            return np.nan
+        values = offsets[:, 0 if mode == "vertical" else 1]
+        return float((np.nanmin(values) + np.nanmax(values)) / 2)
+    if isinstance(artist, Collection):
+        bbox = artist.get_datalim(artist.axes.transData)
+    elif isinstance(artist, PathPatch):
+        bbox = artist.get_path().get_extents()
+    else:
+        bbox = artist.get_bbox()
+    if mode == "vertical":
+        return float(bbox.x0 + bbox.width / 2)
+    return float(bbox.y0 + bbox.height / 2)
+
+
+def _is_index(position, length):
+    try:
+        return 0 <= position < length and int(position) == position
+    except TypeError:
+        return False
+
+
+def get_tick_position(ax, box1, box2, mode):
+    resolver = PositionResolver(ax, mode)
+    return resolver.tick_position(box1), resolver.tick_position(box2)
+
+
+def get_positions(ax, box1, box2, mode):
+    return PositionResolver(ax, mode).get_positions(box1, box2)
+
+
+def get_colors(color, count, name="annotation"):
+    """
+    Return one color per item from a single color or a sequence of colors.
+    """
+    if is_color_like(color):
+        return [color] * count
+    colors = list(color)
+    if len(colors) != count:
+        raise ValueError(
+            f"Got {len(colors)} colors for {count} {name}s, "
+            f"pass a single color or one color per {name}."
+        )
+    return colors
 
-    return position1, position2
+
+# `Line2D` keyword arguments that are spelled differently on collections
+_collection_aliases = {
+    "c": "colors",
+    "color": "colors",
+    "solid_capstyle": "capstyle",
+    "solid_joinstyle": "joinstyle",
+}
+
+
+def get_collection_args(line_args):
+    """
+    Translate the keyword arguments of :meth:`~matplotlib.axes.Axes.plot` to those of a
+    :class:`~matplotlib.collections.LineCollection`.
+    """
+    return {
+        _collection_aliases.get(key, key): value for key, value in line_args.items()
+    }
+
+
+LOGGER_NAME = "✨starbars✨"
 
 
 def get_starbars_logger(level):
-    logger = logging.getLogger("✨starbars✨")
+    """
+    Return the starbars logger, printing its messages from `level` on to the console.
+
+    The console handler is added only once, however many times this is called.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
     logger.setLevel(level)
-    console_handler = logging.StreamHandler()
+    console_handler = next(
+        (
+            handler
+            for handler in logger.handlers
+            if getattr(handler, "_starbars", False)
+        ),
+        None,
+    )
+    if console_handler is None:
+        console_handler = logging.StreamHandler()
+        console_handler._starbars = True
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+        console_handler.setFormatter(formatter)
+        logger.addHandler(console_handler)
     console_handler.setLevel(level)
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
     return logger
 
 
@@ -141,41 +579,97 @@ def create_coordinate_transformer(ax, mode, inverse=False):
     return coords_to_px
 
 
-def find_level(ax, annotations, mode):
-
-    # Sort annotations for optimized stacking
-    sorted_annotations = sorted(
-        annotations,
-        key=lambda x: (
-            min(get_positions(ax, x[0], x[1], mode)),
-            abs(
-                get_positions(ax, x[0], x[1], mode)[1]
-                - get_positions(ax, x[0], x[1], mode)[0]
-            ),
-        ),
-    )
-
-    levels = []
-
-    for box1, box2, pvalue in sorted_annotations:
-
-        # Retrieve positions
-        box_positions = get_positions(ax, box1, box2, mode)
-        box1_pos = min(box_positions)
-        box2_pos = max(box_positions)
-
-        # Find the first available level
-        for level_index, level in enumerate(levels):
-            if all(
-                box1_pos >= existing_end or box2_pos <= existing_start
-                for existing_start, existing_end, _, _ in level
-            ):
-                levels[level_index].append((box1_pos, box2_pos, level_index, pvalue))
-                break
-        else:
-            # Create new level
-            level_index = len(levels)
-            levels.append([(box1_pos, box2_pos, level_index, pvalue)])
+def assign_levels(starts, ends):
+    """
+    Assign each interval to the lowest level where it does not overlap other intervals.
+
+    Intervals are placed from left to right, and each placement searches a segment tree of
+    the right end of every level in O(log L). Placing intervals in order of their left end
+    on the first free level also uses the minimum possible number of levels.
+
+    :param starts: left ends of the intervals, sorted in ascending order.
+    :param ends: right ends of the intervals.
+    :returns: the level of each interval.
+    """
+    count = len(starts)
+    levels = np.zeros(count, dtype=int)
+    size = 1
+    while size < count:
+        size *= 2
+    # Leaves hold the right end of each level, unused levels are always free.
+    tree = [-np.inf] * (2 * size)
+
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        # Descend to the leftmost level whose right end does not exceed the start
+        node = 1
+        while node < size:
+            node = 2 * node if tree[2 * node] <= start else 2 * node + 1
+        levels[i] = node - size
+
+        # Close the level at the end of the interval and update the minima above it
+        tree[node] = end
+        node //= 2
+        while node:
+            tree[node] = min(tree[2 * node], tree[2 * node + 1])
+            node //= 2
+
+    return levels
+
+
+def level_annotations(annotations, resolver, label_widths=None, stats=None):
+    """
+    Resolve the positions of the annotations and stack overlapping ones on separate levels.
+
+    :param annotations: list of tuples containing the box labels and the p-value of the pair,
+      or an :class:`~starbars.AnnotationTable`.
+    :param resolver: the :class:`PositionResolver` of the axes.
+    :param label_widths: width of the label of each annotation, in data coordinates of the
+      cross axis. Bars narrower than their label are stacked as if they were as wide.
+    :param stats: :class:`~starbars.StageStats` recording the time spent resolving the
+      positions and leveling.
+    :returns: the table of the annotations with their positions and levels, grouped by level
+      and in order of position within a level.
+    :rtype: AnnotationTable
+    """
+    table = AnnotationTable.from_annotations(annotations)
+    if stats is None:
+        stats = NULL_STATS
+
+    # Retrieve positions
+    with stats.stage("positions"):
+        start, end = resolver.get_position_arrays(
+            table.box1, table.box2, table.hue1, table.hue2
+        )
 
-    # Flatten list of lists
-    return [annotation for level in levels for annotation in level]
+    with stats.stage("leveling"):
+        lower, upper = start, end
+        if label_widths is not None:
+            middle = (start + end) / 2
+            half_width = np.asarray(label_widths, dtype=float) / 2
+            lower = np.minimum(start, middle - half_width)
+            upper = np.maximum(end, middle + half_width)
+
+        # Sort annotations for optimized stacking
+        order = np.lexsort((upper - lower, lower))
+        level = assign_levels(lower[order], upper[order])
+
+        # Group by level, keeping the sorted order within each level
+        order = order[np.argsort(level, kind="stable")]
+        leveled = table.take(order)
+        leveled.start = start[order]
+        leveled.end = end[order]
+        leveled.level = np.sort(level, kind="stable")
+        return leveled
+
+
+def find_level(ax, annotations, mode, resolver=None):
+    if resolver is None:
+        resolver = PositionResolver(ax, mode)
+
+    leveled = level_annotations(annotations, resolver)
+    return [
+        (start, end, int(level), pvalue)
+        for start, end, level, pvalue in zip(
+            leveled.start.tolist(), leveled.end.tolist(), leveled.level, leveled.pvalue
+        )
+    ]
@@ -0,0 +1,133 @@
+import json
+import tracemalloc
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+BASELINES = Path(__file__).with_name("memory_baselines.json")
+# Peak memory may grow by this factor over its baseline before a benchmark fails
+MEMORY_TOLERANCE = 1.5
+GROUPS = 20
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-memory-baselines",
+        action="store_true",
+        help="Store the peak memory of the starbars benchmarks as their new baselines.",
+    )
+
+
+def pytest_sessionfinish(session):
+    measured = getattr(session.config, "_starbars_peaks", None)
+    if measured and session.config.getoption("--update-memory-baselines"):
+        baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+        baselines.update(measured)
+        BASELINES.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+
+
+def make_plot(count, hue, mode):
+    """
+    Return a bar plot of `GROUPS` groups, with or without 2 hues, and `count` random
+    annotations between its boxes.
+    """
+    rng = np.random.default_rng(0)
+    groups = [f"G{i}" for i in range(GROUPS)]
+    fig, ax = plt.subplots(figsize=(12, 6))
+    if hue:
+        import pandas as pd
+        import seaborn as sns
+
+        df = pd.DataFrame(
+            {
+                "group": np.repeat(groups, 2),
+                "hue": ["x", "y"] * GROUPS,
+                "value": rng.uniform(1, 10, 2 * GROUPS),
+            }
+        )
+        if mode == "vertical":
+            sns.barplot(df, x="group", y="value", hue="hue", ax=ax)
+        else:
+            sns.barplot(df, x="value", y="group", hue="hue", orient="h", ax=ax)
+        boxes = [(hue_label, group) for group in groups for hue_label in "xy"]
+    else:
+        if mode == "vertical":
+            ax.bar(groups, rng.uniform(1, 10, GROUPS))
+        else:
+            ax.barh(groups, rng.uniform(1, 10, GROUPS))
+        boxes = groups
+
+    first = rng.integers(len(boxes), size=count)
+    second = (first + 1 + rng.integers(len(boxes) - 1, size=count)) % len(boxes)
+    pvalues = rng.uniform(0, 0.1, count)
+    annotations = [
+        (boxes[i], boxes[j], pvalue)
+        for i, j, pvalue in zip(first, second, pvalues.tolist())
+    ]
+    return fig, ax, annotations
+
+
+@pytest.fixture(name="make_plot")
+def make_plot_fixture():
+    return make_plot
+
+
+@pytest.fixture(params=[10, 100, 1000], ids=lambda count: f"n{count}")
+def count(request):
+    return request.param
+
+
+@pytest.fixture(params=[False, True], ids=["flat", "hue"])
+def hue(request):
+    return request.param
+
+
+@pytest.fixture(params=["vertical", "horizontal"])
+def mode(request):
+    return request.param
+
+
+@pytest.fixture
+def plot(count, hue, mode):
+    fig, ax, annotations = make_plot(count, hue, mode)
+    yield ax, annotations
+    plt.close(fig)
+
+
+@pytest.fixture
+def peak_memory(request, benchmark):
+    """
+    Return a function that runs a stage once under ``tracemalloc``, reports its peak memory
+    with the benchmark and fails if it grew over the stored baseline.
+    """
+    baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    name = request.node.name
+
+    def measure(function, *args):
+        # Warm up first, so that the one-time caches of matplotlib aren't counted
+        function(*args)
+        tracemalloc.start()
+        try:
+            function(*args)
+            peak = tracemalloc.get_traced_memory()[1] // 1024
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info["peak_memory_kib"] = peak
+        peaks = request.config.__dict__.setdefault("_starbars_peaks", {})
+        peaks[name] = peak
+        baseline = baselines.get(name)
+        if baseline is not None and not request.config.getoption(
+            "--update-memory-baselines"
+        ):
+            assert peak <= max(
+                MEMORY_TOLERANCE * baseline, baseline + 64
+            ), f"Peak memory of {name} grew from {baseline} KiB to {peak} KiB"
+        return peak
+
+    return measure
@@ -0,0 +1,85 @@
+"""
+Benchmarks of each stage of drawing annotations, as the number of annotations grows.
+
+Run them with ``pytest tests/benchmarks``, and see the contributing guidelines to compare
+them with a saved baseline.
+"""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+import starbars
+from starbars._layout import calculate_bars
+from starbars._utils import PositionResolver, level_annotations
+
+
+def resolve_positions(ax, table, mode):
+    # The positions stage of draw_annotation: scan the axes, then resolve the table at once
+    resolver = PositionResolver(ax, mode)
+    return resolver.get_position_arrays(table.box1, table.box2, table.hue1, table.hue2)
+
+
+def test_positions(benchmark, peak_memory, plot, mode):
+    ax, annotations = plot
+    table = starbars.AnnotationTable.from_annotations(annotations)
+    peak_memory(resolve_positions, ax, table, mode)
+    benchmark(resolve_positions, ax, table, mode)
+
+
+def test_leveling(benchmark, peak_memory, plot, mode):
+    ax, annotations = plot
+    resolver = PositionResolver(ax, mode)
+    peak_memory(level_annotations, annotations, resolver)
+    benchmark(level_annotations, annotations, resolver)
+
+
+def test_geometry(benchmark, peak_memory, plot, mode):
+    ax, annotations = plot
+    leveled = level_annotations(annotations, PositionResolver(ax, mode))
+    peak_memory(calculate_bars, ax, leveled, mode)
+    benchmark(calculate_bars, ax, leveled, mode)
+
+
+@pytest.mark.parametrize("line_collection", [False, True], ids=["lines", "collection"])
+def test_drawing(benchmark, peak_memory, plot, mode, line_collection):
+    ax, annotations = plot
+    layout = calculate_bars(
+        ax, level_annotations(annotations, PositionResolver(ax, mode)), mode
+    )
+    args = (
+        np.stack([layout.x, layout.y], axis=-1),
+        np.column_stack([layout.text_x, layout.text_y]),
+        layout.labels,
+        mode,
+        1.5,
+        "k",
+        10,
+        {},
+        {},
+        line_collection,
+    )
+
+    def setup():
+        # Every round draws on new axes, so that artists don't pile up between rounds
+        fig, new_ax = plt.subplots()
+        return (new_ax, *args), {}
+
+    (new_ax, *_), _ = setup()
+    peak_memory(starbars.draw_bars, new_ax, *args)
+    benchmark.pedantic(starbars.draw_bars, setup=setup, rounds=5)
+    plt.close("all")
+
+
+def test_draw_annotation(benchmark, peak_memory, make_plot, count, hue, mode):
+    def setup():
+        fig, ax, annotations = make_plot(count, hue, mode)
+        return (annotations,), {"ax": ax, "mode": mode}
+
+    (annotations,), kwargs = setup()
+    peak_memory(lambda: starbars.draw_annotation(annotations, **kwargs))
+    benchmark.pedantic(starbars.draw_annotation, setup=setup, rounds=3)
+    plt.close("all")
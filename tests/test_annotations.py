@@ -3,7 +3,15 @@ import os
 from pathlib import Path
 import importlib.util
 
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
 import pytest
+from matplotlib.collections import LineCollection
+
+import starbars
 
 
 @pytest.mark.parametrize(
@@ -18,3 +26,194 @@ def test_example_runnable(example):
 
     # Execute the example file
     spec.loader.exec_module(module)
+
+
+def test_line_collection():
+    fig, ax = plt.subplots()
+    ax.bar(["A", "B", "C"], [1, 2, 3])
+    lines, texts = starbars.draw_annotation(
+        [("A", "B", 0.01), ("B", "C", 0.5)],
+        ax=ax,
+        line_collection=True,
+        color=["r", "b"],
+        line_args={"ls": "--"},
+    )
+    assert isinstance(lines, LineCollection)
+    assert len(lines.get_segments()) == 2
+    assert [text.get_text() for text in texts] == ["**", "ns"]
+    assert texts[1].get_color() == "b"
+    plt.close(fig)
+
+
+def test_filtered_annotations_skip_leveling():
+    fig, ax = plt.subplots()
+    ax.bar(["A", "B", "C", "D"], [1, 2, 3, 4])
+    annotations = [
+        ("A", "C", 0.5),
+        ("B", "D", 0.01),
+        ("A", "B", 0.001),
+        ("C", "D", 0.2),
+    ]
+
+    lines, texts = starbars.draw_annotation(annotations, ax=ax, ns_show=False)
+    assert [text.get_text() for text in texts] == ["***", "**"]
+    # The hidden annotation doesn't leave a gap under the remaining bars
+    assert lines[0].get_ydata()[0] == lines[1].get_ydata()[0]
+
+    _, texts = starbars.draw_annotation(annotations, ax=ax, top_k=1)
+    assert [text.get_text() for text in texts] == ["***"]
+    _, texts = starbars.draw_annotation(
+        annotations, ax=ax, predicate=lambda box1, box2, p: "D" in (box1, box2)
+    )
+    assert sorted(text.get_text() for text in texts) == ["**", "ns"]
+
+    # Annotations dropped by the other filters don't fill up the top k
+    _, texts = starbars.draw_annotation(annotations, ax=ax, ns_show=False, top_k=3)
+    assert sorted(text.get_text() for text in texts) == ["**", "***"]
+    _, texts = starbars.draw_annotation(
+        annotations,
+        ax=ax,
+        top_k=3,
+        predicate=lambda box1, box2, p: "A" in (box1, box2),
+    )
+    assert sorted(text.get_text() for text in texts) == ["***", "ns"]
+    plt.close(fig)
+
+
+def test_deferred_artist():
+    fig, ax = plt.subplots()
+    ax.bar(["A", "B", "C"], [1, 2, 3])
+    artist = starbars.draw_annotation(
+        [("A", "B", 0.01), ("A", "C", 0.5)], ax=ax, deferred=True
+    )
+    assert isinstance(artist, starbars.StarbarsArtist)
+    assert [text.get_text() for text in artist.texts] == ["**", "ns"]
+
+    fig.canvas.draw()
+    layout = artist.get_layout()
+    fig.canvas.draw()
+    assert artist.get_layout() is layout
+
+    # The geometry follows changes of the axis limits
+    ax.set_ylim(0, 10)
+    fig.canvas.draw()
+    assert artist.get_layout() is not layout
+    assert artist.lines.get_segments()[1][1, 1] > layout.y[1, 1]
+    plt.close(fig)
+
+
+@pytest.mark.parametrize("line_collection", [False, True])
+def test_update_pvalues(line_collection):
+    fig, ax = plt.subplots()
+    ax.bar(["A", "B", "C"], [1, 2, 3])
+    handle = starbars.draw_annotation(
+        [("A", "B", 0.01), ("B", "C", 0.5), ("A", "C", 0.03)],
+        ax=ax,
+        line_collection=line_collection,
+    )
+    lines, texts = handle
+    assert [text.get_text() for text in texts] == ["**", "ns", "*"]
+
+    artists = handle.update([0.5, 0.001, 0.03], ns_show=False)
+    assert [text.get_text() for text in texts] == ["ns", "***", "*"]
+    assert [text.get_visible() for text in texts] == [False, True, True]
+    assert set(artists) >= set(texts)
+    if line_collection:
+        assert len(lines.get_segments()) == 2
+    else:
+        assert [line.get_visible() for line in lines] == [False, True, True]
+    with pytest.raises(ValueError):
+        handle.update([0.01])
+    plt.close(fig)
+
+
+@pytest.mark.parametrize("threads", [None, 2])
+def test_draw_annotations_figure(threads):
+    fig, axs = plt.subplots(2, 2)
+    for ax in axs.flat:
+        ax.bar(["A", "B", "C"], [1, 2, 3])
+    handles = starbars.draw_annotations_figure(
+        fig,
+        {ax: [("A", "B", 0.01), ("A", "C", 0.5)] for ax in axs.flat},
+        threads=threads,
+        ns_show=False,
+    )
+    assert set(handles) == set(axs.flat)
+    for handle in handles.values():
+        assert [text.get_text() for text in handle.texts] == ["**"]
+    plt.close(fig)
+
+
+def test_draw_annotations_facet_grid():
+    import pandas as pd
+    import seaborn as sns
+
+    df = pd.DataFrame(
+        {"group": list("ABAB"), "value": [1, 2, 3, 4], "panel": list("xxyy")}
+    )
+    grid = sns.catplot(data=df, x="group", y="value", col="panel", kind="bar")
+    handles = starbars.draw_annotations_figure(grid, {"x": [("A", "B", 0.01)]})
+    assert list(handles) == [grid.axes_dict["x"]]
+    with pytest.raises(ValueError):
+        starbars.draw_annotations_figure(grid, {"z": [("A", "B", 0.01)]})
+    plt.close(grid.figure)
+
+
+@pytest.mark.parametrize("mode", ["vertical", "horizontal"])
+def test_fit_limits(mode):
+    fig, ax = plt.subplots()
+    if mode == "vertical":
+        ax.bar(["A", "B", "C"], [1, 2, 3])
+        get_lim = ax.get_ylim
+    else:
+        ax.barh(["A", "B", "C"], [1, 2, 3])
+        get_lim = ax.get_xlim
+    annotations = [("A", "B", 0.01), ("A", "C", 0.5), ("B", "C", 0.001)]
+    limits = get_lim()
+
+    handle = starbars.draw_annotation(annotations, fit_limits="compute", mode=mode)
+    assert handle.limits[0] == limits[0]
+    assert handle.limits[1] > get_lim()[1] > limits[1]
+
+    handle = starbars.draw_annotation(annotations, mode=mode)
+    assert get_lim() == handle.limits
+    plt.close(fig)
+
+
+def test_fit_limits_shared_axes():
+    fig, axs = plt.subplots(1, 2, sharey=True)
+    for ax in axs:
+        ax.bar(["A", "B", "C"], [1, 2, 3])
+    handles = starbars.draw_annotations_figure(
+        fig,
+        {
+            axs[0]: [("A", "B", 0.01)],
+            axs[1]: [("A", "B", 0.01), ("A", "C", 0.01), ("B", "C", 0.01)],
+        },
+    )
+    # Both axes fit the three levels of the second one
+    assert handles[axs[0]].limits == handles[axs[1]].limits == axs[0].get_ylim()
+    top = max(text.get_position()[1] for text in handles[axs[1]].texts)
+    assert top < axs[0].get_ylim()[1]
+    plt.close(fig)
+
+
+@pytest.mark.parametrize("deferred", [False, True])
+def test_profile(deferred):
+    fig, ax = plt.subplots()
+    ax.bar(["A", "B", "C"], [1, 2, 3])
+    annotations = [("A", "B", 0.01), ("A", "C", 0.5), ("B", "C", 0.001)]
+    assert starbars.draw_annotation(annotations, ax=ax).stats is None
+
+    reported = []
+    result = starbars.draw_annotation(
+        annotations, ax=ax, deferred=deferred, profile=reported.append
+    )
+    assert reported == [result.stats]
+    stages = ["filtering", "positions", "leveling", "limits", "geometry", "artists"]
+    assert [*result.stats.times] == stages
+    # Positions are timed when scanning the axes and when resolving the boxes
+    assert result.stats.counts == {**dict.fromkeys(stages, 1), "positions": 2}
+    assert result.stats.total == pytest.approx(sum(result.stats.times.values()))
+    assert "leveling=" in repr(result.stats)
+    plt.close(fig)
@@ -0,0 +1,47 @@
+import functools
+
+import starbars
+
+
+def plot_bars(ax, values):
+    ax.bar(["A", "B", "C"], values)
+
+
+plot_bars_abc = functools.partial(plot_bars, values=[1, 2, 3])
+
+
+def plot_fails(ax):
+    raise RuntimeError("no data")
+
+
+def test_render_batch(tmp_path):
+    jobs = [
+        (
+            functools.partial(plot_bars, values=[1, 2, index]),
+            [("A", "B", 0.01), ("A", "C", 0.5)],
+            tmp_path / f"{index}.png",
+        )
+        for index in range(6)
+    ]
+    jobs.insert(3, (plot_fails, [], tmp_path / "fails.png"))
+
+    results = sorted(
+        starbars.render_batch(
+            iter(jobs), processes=2, figure_args={"dpi": 50}, ns_show=False
+        )
+    )
+    assert [result.index for result in results] == list(range(7))
+    for result, (_, _, path) in zip(results, jobs):
+        assert result.path == path
+        if path.name == "fails.png":
+            assert isinstance(result.error, RuntimeError)
+            assert not path.exists()
+        else:
+            assert result.error is None
+            assert path.read_bytes().startswith(b"\x89PNG")
+
+
+def test_render_batch_invalid_annotations(tmp_path):
+    jobs = [(plot_bars_abc, [("A", "Z", 0.01)], tmp_path / "invalid.png")]
+    (result,) = starbars.render_batch(jobs, processes=1)
+    assert isinstance(result.error, ValueError)
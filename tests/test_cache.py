@@ -0,0 +1,88 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+import starbars
+
+ANNOTATIONS = [("A", "B", 0.01), ("A", "C", 0.5), ("B", "C", "custom")]
+
+
+def draw(cache, figsize=(6, 4), **kwargs):
+    fig, ax = plt.subplots(figsize=figsize)
+    ax.bar(["A", "B", "C"], [1, 2, 3])
+    lines, texts = starbars.draw_annotation(ANNOTATIONS, ax=ax, cache=cache, **kwargs)
+    result = (
+        [line.get_xydata() for line in lines],
+        [(*text.get_position(), text.get_text()) for text in texts],
+        ax.get_ylim(),
+    )
+    plt.close(fig)
+    return result
+
+
+def test_layout_cache_hit(tmp_path, monkeypatch):
+    expected = draw(None)
+    assert draw(tmp_path)[1] == expected[1]
+    assert len([*tmp_path.glob("*.npz")]) == 1
+
+    # Hits skip stacking and laying out the annotations
+    def fail(*args, **kwargs):
+        raise AssertionError("The layout should come from the cache")
+
+    monkeypatch.setattr(starbars, "level_annotations", fail)
+    monkeypatch.setattr(starbars, "calculate_bars", fail)
+    lines, texts, limits = draw(starbars.LayoutCache(tmp_path))
+    for line, expected_line in zip(lines, expected[0]):
+        assert np.array_equal(line, expected_line)
+    assert texts == expected[1]
+    assert limits == expected[2]
+
+
+def test_layout_cache_skips_shared_limits(tmp_path):
+    fig, axs = plt.subplots(1, 2, sharey=True)
+    for ax in axs:
+        ax.bar(["A", "B", "C"], [1, 2, 3])
+    starbars.draw_annotations_figure(
+        fig,
+        {axs[0]: [("A", "B", 0.01)], axs[1]: ANNOTATIONS},
+        cache=tmp_path,
+    )
+    plt.close(fig)
+
+    # The same axes without a sibling isn't given the limits fitted to both
+    def draw_alone(cache):
+        fig, (ax, _) = plt.subplots(1, 2)
+        ax.bar(["A", "B", "C"], [1, 2, 3])
+        starbars.draw_annotation([("A", "B", 0.01)], ax=ax, cache=cache)
+        plt.close(fig)
+        return ax.get_ylim()
+
+    assert draw_alone(tmp_path) == draw_alone(None)
+
+
+def test_layout_cache_font(tmp_path):
+    draw(tmp_path, measure_text=True)
+    with plt.rc_context({"font.family": "serif"}):
+        draw(tmp_path, measure_text=True)
+    assert len([*tmp_path.glob("*.npz")]) == 2
+
+
+@pytest.mark.parametrize(
+    "change", [dict(figsize=(3, 4)), dict(fontsize=14), dict(ns_show=False)]
+)
+def test_layout_cache_miss(tmp_path, change):
+    draw(tmp_path)
+    draw(tmp_path, **change)
+    assert len([*tmp_path.glob("*.npz")]) == 2
+
+
+def test_layout_cache_unreadable(tmp_path):
+    expected = draw(tmp_path)
+    (path,) = tmp_path.glob("*.npz")
+    path.write_bytes(b"not a layout")
+    assert draw(tmp_path)[1] == expected[1]
+    assert path.read_bytes().startswith(b"PK")
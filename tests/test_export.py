@@ -0,0 +1,84 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import json
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+import starbars
+from starbars._layout import calculate_bars
+from starbars._utils import PositionResolver, level_annotations
+
+ANNOTATIONS = [("A", "B", 0.01), ("A", "C", 0.5), ("B", "C", 0.001), ("A", "B", 0.9)]
+
+
+@pytest.mark.parametrize("mode", ["vertical", "horizontal"])
+def test_compute_layout_matches_plot(mode):
+    fig, ax = plt.subplots()
+    if mode == "vertical":
+        ax.bar(["A", "B", "C"], [1, 2, 3])
+    else:
+        ax.barh(["A", "B", "C"], [1, 2, 3])
+    geometry = starbars.AxesGeometry(
+        ax.get_xlim(), ax.get_ylim(), ax.bbox.width, ax.bbox.height, fig.dpi
+    )
+    layout, limits = starbars.compute_layout(
+        ANNOTATIONS, {"A": 0, "B": 1, "C": 2}, geometry, mode=mode, ns_show=False
+    )
+    lines, texts = starbars.draw_annotation(ANNOTATIONS, mode=mode, ns_show=False)
+
+    assert list(layout.index) == [0, 2]
+    assert [*layout.labels] == [text.get_text() for text in texts]
+    assert np.allclose(
+        np.stack([layout.x, layout.y], axis=-1), [l.get_xydata() for l in lines]
+    )
+    assert np.allclose(limits, ax.get_ylim() if mode == "vertical" else ax.get_xlim())
+    plt.close(fig)
+
+
+def test_compute_layout_hue_and_log_scale():
+    geometry = starbars.AxesGeometry((-0.5, 1.5), (1, 100), 400, 300, yscale="log")
+    positions = {("x", "A"): -0.2, ("y", "A"): 0.2, ("x", "B"): 0.8}
+    layout, limits = starbars.compute_layout(
+        [(("x", "A"), ("y", "A"), 0.01), (("x", "A"), ("x", "B"), 0.01)],
+        positions,
+        geometry,
+    )
+    assert list(layout.level) == [0, 1]
+    assert np.all(layout.y > 100) and limits[1] > layout.text_y.max()
+    with pytest.raises(ValueError):
+        starbars.compute_layout([("A", "B", 0.01)], positions, geometry)
+
+
+def test_data_placement_needs_axes():
+    geometry = starbars.AxesGeometry((0, 1), (0, 1), 100, 100)
+    leveled = level_annotations(
+        [("A", "B", 0.01)], PositionResolver.from_positions({"A": 0, "B": 1})
+    )
+    with pytest.raises(ValueError):
+        calculate_bars(geometry, leveled, placement="data")
+    assert (
+        calculate_bars(geometry, leveled, placement="data", baseline=[0.5]).y.min()
+        > 0.5
+    )
+
+
+@pytest.mark.parametrize("format", ["dict", "json", "arrow"])
+def test_export_layout(format):
+    if format == "arrow":
+        pytest.importorskip("pyarrow")
+    geometry = starbars.AxesGeometry((-0.5, 2.5), (0, 3), 400, 300)
+    layout, limits = starbars.compute_layout(
+        ANNOTATIONS, {"A": 0, "B": 1, "C": 2}, geometry
+    )
+    exported = starbars.export_layout(layout, limits, format=format)
+    if format == "json":
+        columns = ["x", "y", "text_x", "text_y", "level", "index", "label", "limits"]
+        assert sorted(json.loads(exported)) == sorted(columns)
+    imported, imported_limits = starbars.import_layout(exported, format=format)
+    assert imported_limits == pytest.approx(limits)
+    for field, values in zip(layout._fields, imported):
+        assert np.array_equal(values, getattr(layout, field))
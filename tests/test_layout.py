@@ -0,0 +1,148 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from starbars._extents import DataExtentIndex
+from starbars._layout import (
+    calculate_bars,
+    get_data_baseline,
+    get_fitted_limits,
+    get_label_widths,
+    get_limits_transform,
+    stack_bars,
+)
+from starbars._utils import PositionResolver, find_level, level_annotations
+
+
+@pytest.fixture
+def ax():
+    fig, ax = plt.subplots()
+    ax.bar(["A", "B", "C", "D"], [1, 2, 3, 4])
+    yield ax
+    plt.close(fig)
+
+
+def test_calculate_bars(ax):
+    annotations = [("A", "D", 0.1), ("A", "B", 0.001), ("C", "D", 0.03)]
+    layout = calculate_bars(
+        ax, level_annotations(annotations, PositionResolver(ax, "vertical"))
+    )
+    assert layout.x.shape == layout.y.shape == (3, 4)
+    assert list(layout.index) == [1, 2, 0]
+    assert list(layout.labels) == ["***", "*", "ns"]
+    # Brackets start above the axis limit and higher levels are stacked on top
+    assert np.all(layout.y > ax.get_ylim()[1])
+    assert layout.y[2].min() > layout.y[:2].max()
+    # Text is centered above the bracket
+    assert np.allclose(layout.text_x, layout.x.mean(axis=1))
+    assert np.all(layout.text_y > layout.y.max(axis=1))
+
+
+def test_calculate_bars_from_find_level(ax):
+    leveled = find_level(ax, [("A", "B", 0.2), ("B", "C", 0.01)], "vertical")
+    layout = calculate_bars(ax, leveled, ns_show=False)
+    assert list(layout.labels) == ["**"]
+    assert list(layout.index) == [1]
+
+
+def test_data_extent_index():
+    fig, ax = plt.subplots()
+    ax.bar([0, 1, 2, 3], [5, 1, 2, 4], width=0.8)
+    ax.plot([1, 1], [0, 3])
+    ax.scatter([2.1, 2.2], [7, 2])
+    index = DataExtentIndex(ax, "vertical")
+    tops = index.query([0, 1, 1, 2.5, 1.5], [1, 2.15, 1, 3, 1.55])
+    # Bars reach over their width, lines and markers only at their positions
+    assert tops[:4] == pytest.approx([5, 7, 3, 4])
+    assert np.isnan(tops[4])
+    plt.close(fig)
+
+
+def _stack_brute_force(starts, ends, bases, height):
+    placed = []
+    for start, end, base in zip(starts, ends, bases):
+        offset = base
+        for other_start, other_end, other_offset in placed:
+            if (
+                start < other_end
+                and other_start < end
+                or start == end == other_start == other_end
+            ):
+                offset = max(offset, other_offset + height)
+        placed.append((start, end, offset))
+    return [offset for *_, offset in placed]
+
+
+def test_stack_bars_matches_brute_force():
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        bounds = np.sort(rng.integers(0, 12, size=(40, 2)), axis=1)
+        bases = rng.random(40) * 5
+        offsets = stack_bars(bounds[:, 0], bounds[:, 1], bases, 1.5)
+        assert offsets == pytest.approx(
+            _stack_brute_force(bounds[:, 0], bounds[:, 1], bases, 1.5)
+        )
+
+
+def test_data_placement(ax):
+    annotations = [("A", "B", 0.01), ("C", "D", 0.01)]
+    leveled = level_annotations(annotations, PositionResolver(ax, "vertical"))
+    layout = calculate_bars(ax, leveled, placement="data")
+    # Each bracket sits above its own data instead of the axis limit
+    assert 2 < layout.y[0].min() < layout.y[1].min() < ax.get_ylim()[1]
+
+
+@pytest.mark.parametrize("placement", ["top", "data"])
+@pytest.mark.parametrize("scale", ["linear", "log"])
+def test_fitted_limits(ax, placement, scale):
+    ax.set_yscale(scale)
+    annotations = [("A", "D", 0.1), ("A", "B", 0.001), ("C", "D", 0.03)]
+    leveled = level_annotations(annotations, PositionResolver(ax, "vertical"))
+    if placement == "data":
+        baseline = get_data_baseline(ax, leveled, "vertical")
+    else:
+        baseline = ax.get_ylim()[1]
+    limits = get_fitted_limits(ax, leveled, baseline, placement=placement)
+    assert limits[0] == ax.get_ylim()[0] and limits[1] > ax.get_ylim()[1]
+
+    layout = calculate_bars(
+        ax,
+        leveled,
+        baseline=baseline,
+        placement=placement,
+        transform=get_limits_transform(ax, "vertical", limits),
+    )
+    ax.set_ylim(limits)
+    # The last level, label included, ends `top_margin` below the new upper limit
+    top = ax.transAxes.inverted().transform(
+        ax.transData.transform((0, layout.text_y.max()))
+    )[1]
+    text_height = 10 / 72 * ax.figure.dpi / ax.bbox.height
+    assert top + text_height + 0.03 == pytest.approx(0.95, abs=1e-6)
+    # Bars that already fit keep the limits
+    assert get_fitted_limits(ax, leveled, baseline, placement=placement) == limits
+
+
+def test_measured_text(ax):
+    annotations = [("A", "B", "first\nsecond"), ("A", "C", 0.01)]
+    leveled = level_annotations(annotations, PositionResolver(ax, "vertical"))
+    estimated = calculate_bars(ax, leveled)
+    measured = calculate_bars(ax, leveled, measure_text=True)
+    # The second level starts above the two lines of the first label
+    gap = measured.y[1].min() - measured.y[0].max()
+    assert gap > estimated.y[1].min() - estimated.y[0].max()
+    label_top = ax.transData.transform((0, measured.text_y[0]))[1] + 14
+    assert label_top < ax.transData.transform((0, measured.y[1].min()))[1]
+
+
+def test_label_widths_level_annotations(ax):
+    ax.figure.set_size_inches(3, 4)
+    annotations = [("A", "B", "p = 0.00001 (t-test)"), ("C", "D", "p = 0.00001")]
+    resolver = PositionResolver(ax, "vertical")
+    assert list(level_annotations(annotations, resolver).level) == [0, 0]
+    widths = get_label_widths(ax, annotations, "vertical")
+    assert list(level_annotations(annotations, resolver, widths).level) == [0, 1]
@@ -0,0 +1,39 @@
+import importlib
+import logging
+import subprocess
+import sys
+
+import starbars
+from starbars._utils import LOGGER_NAME, get_starbars_logger
+
+# Modules that are slow to import and only needed by some features
+LAZY_MODULES = ["matplotlib.pyplot", "matplotlib.axes", "scipy", "pandas", "seaborn"]
+
+
+def test_import_is_lazy():
+    # A fresh interpreter, as the test session has imported most of these already
+    code = "import sys, starbars; print(*[m for m in sys.argv[1:] if m in sys.modules])"
+    result = subprocess.run(
+        [sys.executable, "-c", code, *LAZY_MODULES],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split() == []
+    assert result.stderr == ""
+
+
+def test_logger_setup_is_idempotent():
+    logger = logging.getLogger(LOGGER_NAME)
+    count = len(logger.handlers)
+    importlib.reload(starbars)
+    assert len(logger.handlers) == count
+
+    level, handlers = logger.level, logger.handlers[:]
+    try:
+        get_starbars_logger(logging.DEBUG)
+        get_starbars_logger(logging.DEBUG)
+        assert len(logger.handlers) <= len(handlers) + 1
+    finally:
+        logger.setLevel(level)
+        logger.handlers[:] = handlers
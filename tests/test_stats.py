@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.stats
+
+import starbars
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(0)
+    return {f"g{i}": rng.normal(i / 4, 1, 10 + i) for i in range(5)}
+
+
+@pytest.mark.parametrize(
+    "test, reference",
+    [
+        ("t-test", lambda x, y: scipy.stats.ttest_ind(x, y).pvalue),
+        ("welch", lambda x, y: scipy.stats.ttest_ind(x, y, equal_var=False).pvalue),
+        ("mann-whitney", lambda x, y: scipy.stats.mannwhitneyu(x, y).pvalue),
+    ],
+)
+def test_pairwise_tests(samples, test, reference):
+    annotations = starbars.pairwise_tests(samples, test)
+    assert len(annotations) == 10
+    for group1, group2, pvalue in annotations:
+        assert pvalue == pytest.approx(reference(samples[group1], samples[group2]))
+
+
+@pytest.mark.parametrize("size", [6, 12])
+def test_pairwise_mannwhitney_equal_sizes(size):
+    rng = np.random.default_rng(1)
+    samples = {f"g{i}": rng.normal(i / 4, 1, size) for i in range(4)}
+    # Ties in one group must not change the method used for the other pairs
+    samples["g0"][1] = samples["g0"][0]
+    for group1, group2, pvalue in starbars.pairwise_tests(samples, "mann-whitney"):
+        assert pvalue == pytest.approx(
+            scipy.stats.mannwhitneyu(samples[group1], samples[group2]).pvalue
+        )
+
+
+def test_pairwise_tests_dataframe(samples):
+    df = pd.DataFrame(
+        [(group, value) for group, values in samples.items() for value in values],
+        columns=["group", "value"],
+    )
+    assert starbars.pairwise_tests(df, group="group", value="value") == (
+        starbars.pairwise_tests(samples)
+    )
+    with pytest.raises(ValueError):
+        starbars.pairwise_tests(df)
+
+
+def test_adjust_pvalues():
+    pvalues = np.array([0.01, 0.04, 0.03, 0.005, np.nan, 0.2])
+    assert starbars.adjust_pvalues(pvalues, "bonferroni") == pytest.approx(
+        [0.05, 0.2, 0.15, 0.025, np.nan, 1], nan_ok=True
+    )
+    assert starbars.adjust_pvalues(pvalues, "holm") == pytest.approx(
+        [0.04, 0.09, 0.09, 0.025, np.nan, 0.2], nan_ok=True
+    )
+    assert starbars.adjust_pvalues(pvalues, "fdr_bh") == pytest.approx(
+        [0.025, 0.05, 0.05, 0.025, np.nan, 0.2], nan_ok=True
+    )
+    assert list(starbars.adjust_pvalues([0.01, "label", 0.02], "holm")) == [
+        0.02,
+        "label",
+        0.02,
+    ]
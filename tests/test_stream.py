@@ -0,0 +1,69 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import tracemalloc
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+import starbars
+from starbars._stream import filter_annotation_stream, prepare_annotations
+
+
+def make_annotations(count, seed=0):
+    rng = np.random.default_rng(seed)
+    pvalues = rng.random(count) ** 4
+    for i, pvalue in enumerate(pvalues):
+        yield f"g{i % 50}", f"g{(i * 7 + 1) % 50}", float(pvalue)
+
+
+@pytest.mark.parametrize("correction", [None, "holm", "fdr_bh"])
+@pytest.mark.parametrize("ns_show", [True, False])
+@pytest.mark.parametrize("top_k", [None, 0, 25])
+def test_stream_matches_list(correction, ns_show, top_k):
+    annotations = [*make_annotations(1000)]
+    args = dict(
+        ns_show=ns_show,
+        top_k=top_k,
+        correction=correction,
+        predicate=lambda box1, box2, pvalue: box1 != "g3",
+    )
+    expected, count = prepare_annotations(annotations, **args)
+    table, read = filter_annotation_stream(iter(annotations), chunk_size=64, **args)
+    assert read == count == 1000
+    assert list(table.index) == list(expected.index)
+    assert np.array_equal(table.pvalue, expected.pvalue)
+    assert [*table] == [*expected]
+
+
+def test_draw_annotation_generator():
+    fig, axs = plt.subplots(1, 2)
+    for ax in axs:
+        ax.bar([f"g{i}" for i in range(50)], np.ones(50))
+    expected = starbars.draw_annotation(
+        [*make_annotations(300)], ax=axs[0], ns_show=False, line_collection=True
+    )
+    handle = starbars.draw_annotation(
+        make_annotations(300), ax=axs[1], ns_show=False, line_collection=True
+    )
+    assert list(handle.order) == list(expected.order)
+    assert np.allclose(handle.lines.get_segments(), expected.lines.get_segments())
+    plt.close(fig)
+
+
+def test_stream_memory_follows_kept_annotations():
+    def peak(count):
+        tracemalloc.start()
+        try:
+            table = filter_annotation_stream(make_annotations(count), top_k=10)[0]
+            return tracemalloc.get_traced_memory()[1], len(table)
+        finally:
+            tracemalloc.stop()
+
+    small, kept = peak(10_000)
+    large = peak(100_000)[0]
+    assert kept == 10
+    # Ten times as many annotations read, but not ten times the memory
+    assert large < 2 * small
@@ -0,0 +1,152 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+import seaborn as sns
+
+import starbars
+from starbars._utils import PositionResolver, filter_annotations, level_annotations
+
+ANNOTATIONS = [("A", "B", 0.01), ("A", "C", 0.5), ("B", "C", 0.001), ("A", "B", 0.9)]
+
+
+def test_table_from_annotations():
+    table = starbars.AnnotationTable.from_annotations(ANNOTATIONS)
+    assert len(table) == 4
+    assert [*table] == ANNOTATIONS
+    assert table[2] == ("B", "C", 0.001)
+    assert table.pvalue.dtype == float
+    assert starbars.AnnotationTable.from_annotations(table) is table
+
+    # Hue boxes stay tuples, and labels stay next to the p-values
+    table = starbars.AnnotationTable.from_annotations(
+        [(("x", "A"), ("y", "A"), "ns"), (("x", "B"), ("y", "B"), 0.01)]
+    )
+    assert table.box1[0] == ("x", "A")
+    assert [*table.pvalue] == ["ns", 0.01]
+
+    with pytest.raises(ValueError):
+        starbars.AnnotationTable.from_annotations([("A", "B")])
+
+
+def test_table_stages_keep_original_index():
+    fig, ax = plt.subplots()
+    ax.bar(["A", "B", "C"], [1, 2, 3])
+    kept, index = filter_annotations(ANNOTATIONS, ns_show=False)
+    assert isinstance(kept, starbars.AnnotationTable)
+    assert list(kept.index) == list(index) == [0, 2]
+
+    leveled = level_annotations(kept, PositionResolver(ax, "vertical"))
+    assert list(leveled.index) == [0, 2]
+    assert list(leveled.start) == [0, 1]
+    assert list(leveled.end) == [1, 2]
+    assert list(leveled.level) == [0, 0]
+    assert leveled.box1 is not None and [*leveled.box1] == ["A", "B"]
+    plt.close(fig)
+
+
+def test_draw_annotation_table():
+    fig, axs = plt.subplots(1, 2)
+    for ax in axs:
+        ax.bar(["A", "B", "C"], [1, 2, 3])
+    table = starbars.AnnotationTable(
+        *map(np.asarray, zip(*ANNOTATIONS)),
+    )
+    expected = starbars.draw_annotation(ANNOTATIONS, ax=axs[0], correction="holm")
+    handle = starbars.draw_annotation(table, ax=axs[1], correction="holm")
+    assert list(handle.order) == list(expected.order)
+    assert [text.get_text() for text in handle.texts] == [
+        text.get_text() for text in expected.texts
+    ]
+    assert np.allclose(
+        [line.get_xydata() for line in handle.lines],
+        [line.get_xydata() for line in expected.lines],
+    )
+    plt.close(fig)
+
+
+def test_filters_leave_table_unchanged():
+    fig, ax = plt.subplots()
+    ax.bar(["A", "B", "C", "D"], [1, 2, 3, 4])
+    table = starbars.AnnotationTable.from_annotations(
+        [("A", "B", 0.5), ("A", "C", 0.01), ("B", "C", 0.7), ("A", "D", 0.02)]
+    )
+    handle = starbars.draw_annotation(table, ax=ax, ns_show=False, top_k=3)
+    assert list(table.pvalue) == [0.5, 0.01, 0.7, 0.02]
+    assert list(handle.order) == [1, 3]
+    kept = filter_annotations(table, top_k=2)[0]
+    assert list(kept.pvalue) == [0.01, 0.02]
+    assert list(table.pvalue) == [0.5, 0.01, 0.7, 0.02]
+    plt.close(fig)
+
+
+def test_draw_annotation_dataframe():
+    df = pd.DataFrame(
+        {
+            "score": np.arange(12.0),
+            "subject": np.repeat(["Math", "Science", "Art"], 4),
+            "gender": np.tile(["Male", "Female"], 6),
+        }
+    )
+    results = pd.DataFrame(
+        {
+            "group1": ["Math", "Math", "Science"],
+            "group2": ["Science", "Math", "Art"],
+            "hue1": ["Male", "Male", "Female"],
+            "hue2": ["Male", "Female", "Female"],
+            "pvalue": [0.01, 0.001, 0.2],
+        }
+    )
+    fig, axs = plt.subplots(1, 2)
+    for ax in axs:
+        sns.barplot(data=df, x="subject", y="score", hue="gender", ax=ax)
+    expected = starbars.draw_annotation(
+        [
+            ((row.hue1, row.group1), (row.hue2, row.group2), row.pvalue)
+            for row in results.itertuples()
+        ],
+        ax=axs[0],
+    )
+    handle = starbars.draw_annotation(results, ax=axs[1])
+    assert list(handle.order) == list(expected.order)
+    assert np.allclose(
+        [line.get_xydata() for line in handle.lines],
+        [line.get_xydata() for line in expected.lines],
+    )
+    plt.close(fig)
+
+
+def test_columns_resolve_each_box_once(monkeypatch):
+    fig, ax = plt.subplots()
+    ax.bar(["A", "B", "C"], [1, 2, 3])
+    resolver = PositionResolver(ax, "vertical")
+    calls = []
+    tick_position = resolver.tick_position
+    monkeypatch.setattr(
+        resolver, "tick_position", lambda box: calls.append(box) or tick_position(box)
+    )
+    rng = np.random.default_rng(0)
+    columns = {
+        "group1": rng.choice(["A", "B"], 1000),
+        "group2": rng.choice(["B", "C"], 1000),
+        "pvalue": rng.random(1000),
+    }
+    leveled = level_annotations(columns, resolver)
+    assert sorted(calls) == ["A", "B", "C"]
+    order = leveled.index
+    assert np.array_equal(
+        leveled.start, np.where(columns["group1"][order] == "A", 0.0, 1.0)
+    )
+    assert np.array_equal(
+        leveled.end, np.where(columns["group2"][order] == "C", 2.0, 1.0)
+    )
+
+    with pytest.raises(ValueError, match="pvalue"):
+        starbars.AnnotationTable.from_columns({"group1": [], "group2": []})
+    with pytest.raises(ValueError, match="hue2"):
+        starbars.AnnotationTable.from_columns(dict(columns, hue1=columns["group1"]))
+    plt.close(fig)
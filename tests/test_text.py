@@ -0,0 +1,31 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from starbars._text import TextMetricsCache, get_text_extents
+
+
+def test_text_metrics_cache():
+    cache = TextMetricsCache(maxsize=2)
+    fig = Figure(dpi=100)
+    sizes = cache.measure(fig, ["*", "***", "*", "*\n*"])
+    assert sizes[0, 0] < sizes[1, 0] and sizes[0, 1] == sizes[1, 1]
+    assert np.array_equal(sizes[0], sizes[2])
+    assert sizes[3, 1] > 2 * sizes[0, 1]
+    # The least recently used label is evicted
+    assert [key[0] for key in cache._sizes] == ["*", "*\n*"]
+    # Sizes follow the DPI
+    fig.set_dpi(200)
+    assert np.allclose(cache.measure(fig, ["*"]), 2 * sizes[0], atol=2)
+
+
+def test_text_extents_rotate_with_mode():
+    fig = Figure()
+    cross, along = get_text_extents(fig, ["p = 0.001"], mode="vertical")
+    assert np.allclose(
+        get_text_extents(fig, ["p = 0.001"], mode="horizontal"), (cross, along)
+    )
+    assert cross[0] > along[0]
@@ -0,0 +1,72 @@
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from matplotlib.figure import Figure
+
+import starbars
+
+ANNOTATIONS = [
+    ("A", "B", 0.01),
+    ("A", "C", "p = 0.2\n(t-test)"),
+    ("B", "D", 1e-5),
+    ("C", "D", 0.5),
+]
+
+
+def annotate(seed):
+    # Only the object-oriented API, as a server rendering figures would use it
+    rng = np.random.default_rng(seed)
+    fig = Figure()
+    ax = fig.add_subplot()
+    ax.bar(["A", "B", "C", "D"], rng.uniform(1, 10, 4))
+    lines, texts = starbars.draw_annotation(
+        ANNOTATIONS, ax=ax, measure_text=seed % 2 == 0, line_collection=seed % 3 == 0
+    )
+    segments = (
+        lines.get_segments() if seed % 3 == 0 else [l.get_xydata() for l in lines]
+    )
+    return np.concatenate([*segments, [t.get_position() for t in texts]])
+
+
+def test_concurrent_annotation():
+    expected = [annotate(seed) for seed in range(100)]
+    with ThreadPoolExecutor(8) as executor:
+        results = [*executor.map(annotate, range(100))]
+    for result, single in zip(results, expected):
+        assert np.array_equal(result, single)
+
+
+def test_thread_pool_without_pyplot():
+    code = """
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import starbars
+
+def render(seed):
+    fig = Figure()
+    ax = fig.add_subplot()
+    ax.bar(["A", "B", "C"], [1, 2 + seed % 5, 3])
+    starbars.draw_annotation(
+        [("A", "B", 0.01), ("B", "C", 0.5), ("A", "C", "x")],
+        ax=ax,
+        deferred=seed % 2 == 0,
+        measure_text=True,
+    )
+    FigureCanvasAgg(fig).print_png(BytesIO())
+
+with ThreadPoolExecutor(8) as executor:
+    [*executor.map(render, range(40))]
+assert "matplotlib.pyplot" not in sys.modules
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == ""
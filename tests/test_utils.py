@@ -0,0 +1,168 @@
+from functools import partial
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+import seaborn as sns
+
+from starbars._utils import (
+    PositionResolver,
+    assign_levels,
+    find_level,
+    label_pvalues,
+    pvalue_to_asterisks,
+    pvalues_to_asterisks,
+)
+
+
+@pytest.fixture
+def hue_ax():
+    df = pd.DataFrame(
+        {
+            "Score": [85, 90, 88, 72, 95, 78],
+            "Subject": ["Math", "Math", "Science", "Science", "Math", "Science"],
+            "Gender": ["Male", "Female", "Male", "Female", "Male", "Female"],
+        }
+    )
+    fig, ax = plt.subplots()
+    sns.barplot(data=df, x="Subject", y="Score", hue="Gender", ax=ax)
+    yield ax
+    plt.close(fig)
+
+
+def test_resolver_ticks():
+    fig, ax = plt.subplots()
+    ax.bar(["A", "B", "C"], [1, 2, 3])
+    resolver = PositionResolver(ax, "vertical")
+    assert resolver.get_positions("C", "A") == (2, 0)
+    # Unknown labels are used as positions
+    assert resolver.get_positions(1.5, "B") == (1.5, 1)
+    with pytest.raises(ValueError, match="'Z'"):
+        resolver.get_positions("A", "Z")
+    plt.close(fig)
+
+
+def test_resolver_hue(hue_ax):
+    resolver = PositionResolver(hue_ax, "vertical")
+    male_math, female_science = resolver.get_positions(
+        ("Male", "Math"), ("Female", "Science")
+    )
+    assert male_math == pytest.approx(-0.2)
+    assert female_science == pytest.approx(1.2)
+    with pytest.raises(ValueError):
+        resolver.get_positions(("Male", "Math"), "Science")
+
+
+@pytest.mark.parametrize(
+    "plot",
+    [
+        sns.barplot,
+        sns.boxplot,
+        sns.violinplot,
+        partial(sns.violinplot, fill=False),
+        partial(sns.stripplot, dodge=True, jitter=False),
+    ],
+)
+@pytest.mark.parametrize("mode", ["vertical", "horizontal"])
+def test_resolver_hue_plots(plot, mode):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "day": np.repeat(["Thu", "Fri", "Sat"], 20),
+            "sex": np.tile(["M", "F"], 30),
+            "value": rng.normal(size=60),
+        }
+    )
+    # Groups without some of the hues keep the positions of the others
+    df = df[(df["day"] != "Fri") | (df["sex"] == "F")]
+    fig, ax = plt.subplots()
+    if mode == "vertical":
+        plot(data=df, x="day", y="value", hue="sex", ax=ax)
+    else:
+        plot(data=df, x="value", y="day", hue="sex", ax=ax)
+    resolver = PositionResolver(ax, mode)
+    assert resolver.hue_positions == pytest.approx(
+        {
+            ("M", "Thu"): -0.2,
+            ("F", "Thu"): 0.2,
+            ("F", "Fri"): 1.2,
+            ("M", "Sat"): 1.8,
+            ("F", "Sat"): 2.2,
+        }
+    )
+    assert resolver.get_positions(("F", 1), ("M", "Sat")) == pytest.approx((1.2, 1.8))
+    with pytest.raises(ValueError, match="'M' in group 'Fri'"):
+        resolver.get_positions(("M", "Fri"), ("F", "Fri"))
+    plt.close(fig)
+
+
+def test_resolver_labelled_bars():
+    fig, ax = plt.subplots()
+    ax.bar([0.8, 1.8], [1, 2], width=0.4, label="before")
+    ax.bar([1.2, 2.2], [2, 3], width=0.4, label="after")
+    ax.set_xticks([1, 2], ["A", "B"])
+    ax.legend()
+    resolver = PositionResolver(ax, "vertical")
+    assert resolver.get_positions(("before", "A"), ("after", "B")) == (0.8, 2.2)
+    plt.close(fig)
+
+
+def test_find_level_stacking():
+    fig, ax = plt.subplots()
+    ax.bar(["A", "B", "C", "D"], [1, 2, 3, 4])
+    leveled = find_level(
+        ax, [("A", "D", 0.1), ("A", "B", 0.2), ("C", "D", 0.3)], "vertical"
+    )
+    assert [level for _, _, level, _ in leveled] == [0, 0, 1]
+    assert [pvalue for *_, pvalue in leveled] == [0.2, 0.3, 0.1]
+    plt.close(fig)
+
+
+def _first_fit(intervals):
+    levels = []
+    result = []
+    for start, end in intervals:
+        for level_index, level in enumerate(levels):
+            if all(start >= e or end <= s for s, e in level):
+                level.append((start, end))
+                break
+        else:
+            level_index = len(levels)
+            levels.append([(start, end)])
+        result.append(level_index)
+    return result
+
+
+def test_assign_levels_matches_first_fit():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        bounds = np.sort(rng.integers(0, 15, size=(60, 2)), axis=1)
+        bounds = bounds[np.lexsort((bounds[:, 1] - bounds[:, 0], bounds[:, 0]))]
+        levels = assign_levels(bounds[:, 0], bounds[:, 1])
+        assert list(levels) == _first_fit(bounds.tolist())
+
+
+def test_pvalues_to_asterisks():
+    pvalues = pd.Series([0.00001, 0.0005, 0.01, 0.05, 0.5, np.nan])
+    assert list(pvalues_to_asterisks(pvalues)) == ["****", "***", "**", "*", "ns", "ns"]
+    # Labels that aren't numbers are passed through
+    assert list(pvalues_to_asterisks([0.02, "custom", "0.002"])) == [
+        "*",
+        "custom",
+        "**",
+    ]
+    assert pvalue_to_asterisks(0.003) == "**"
+
+
+def test_custom_thresholds():
+    thresholds = [(0.001, "p < 0.001"), (0.05, "p = {:.2f}")]
+    labels, ns = label_pvalues([0.0001, 0.012, 0.3], thresholds)
+    assert list(labels) == ["p < 0.001", "p = 0.01", "ns"]
+    assert list(ns) == [False, False, True]
+    with pytest.raises(ValueError):
+        pvalues_to_asterisks([0.1], [(0.05, "*"), (0.01, "**")])